@@ -0,0 +1,118 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Synthetic input assets. Images have random dimensions between the minimum and maximum size (log-uniformly
+# distributed, so small images are as common as in real games), random aspect ratio, and mix of smooth gradient and
+# noise so they're neither trivial nor impossible to compress.
+
+import math
+import os
+import random
+import struct
+import zlib
+
+
+class CorpusSpec:
+    def __init__(
+        self,
+        count: int = 100,
+        min_size: int = 16,
+        max_size: int = 512,
+        sprites: int = 100,
+        sprite_size: int = 64,
+        seed: int = 1,
+    ):
+        self.count = count
+        self.min_size = min_size
+        self.max_size = max_size
+        self.sprites = sprites
+        self.sprite_size = sprite_size
+        self.seed = seed
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+def png_chunk(kind: bytes, data: bytes):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def make_png(width: int, height: int, rng: random.Random):
+    # Each row is the gradient row shifted, with some rows replaced by noise
+    stride = width * 4
+    step = rng.randint(1, 7)
+    base = bytes((i * step) & 255 for i in range(stride * 2))
+    rows = []
+    for y in range(height):
+        if rng.random() < 0.1:
+            row = rng.randbytes(stride)
+        else:
+            offset = (y * 4) % stride
+            row = base[offset : offset + stride]
+        rows.append(b"\x00" + row)
+    header = struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + png_chunk(b"IHDR", header)
+        + png_chunk(b"IDAT", zlib.compress(b"".join(rows), 6))
+        + png_chunk(b"IEND", b"")
+    )
+
+
+def random_size(rng: random.Random, min_size: int, max_size: int):
+    size = math.exp(rng.uniform(math.log(min_size), math.log(max_size)))
+    aspect = math.exp(rng.uniform(math.log(0.5), math.log(2)))
+    width = int(min(max(size * math.sqrt(aspect), 1), max_size))
+    height = int(min(max(size / math.sqrt(aspect), 1), max_size))
+    return width, height
+
+
+def generate(directory: str, spec: CorpusSpec):
+    # Writes images/, sprites/, sprites.pack, and the asset definition files. Returns the path to the
+    # definition files by name.
+    rng = random.Random(spec.seed)
+    images = os.path.join(directory, "images")
+    sprites = os.path.join(directory, "sprites")
+    os.makedirs(images, exist_ok=True)
+    os.makedirs(sprites, exist_ok=True)
+    for i in range(spec.count):
+        width, height = random_size(rng, spec.min_size, spec.max_size)
+        with open(os.path.join(images, f"image{i:04d}.png"), "wb") as f:
+            f.write(make_png(width, height, rng))
+    for i in range(spec.sprites):
+        width, height = random_size(rng, max(spec.sprite_size // 4, 1), spec.sprite_size)
+        with open(os.path.join(sprites, f"sprite{i:04d}.png"), "wb") as f:
+            f.write(make_png(width, height, rng))
+    # Packer Guin file, the atlas is big enough for all sprites in single page
+    atlas_size = 2 ** math.ceil(math.log2(math.sqrt(max(spec.sprites, 1)) * (spec.sprite_size + 16) * 1.5))
+    with open(os.path.join(directory, "sprites.pack"), "w", encoding="UTF-8") as f:
+        f.write(f"output atlas/sprites\nsize {atlas_size}\nextrude 1\nprefix assets\n\nfolder sprites\n")
+    definitions = {
+        "images": "prefix assets\nfolder images\n",
+        "resize": "prefix assets\nfolder images resize 50%\n",
+        "mipmap": "prefix assets\nenable mipmap\nfolder images\n",
+        "atlas": "prefix assets\npack sprites.pack\n",
+    }
+    result = {}  # type: dict[str, str]
+    for name, content in definitions.items():
+        result[name] = os.path.join(directory, f"{name}.txt")
+        with open(result[name], "w", encoding="UTF-8") as f:
+            f.write(content)
+    return result
@@ -0,0 +1,225 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+if __name__ == "__main__" and __package__ is None:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(os.path.abspath(__file__)))))
+    __package__ = "benchmarks"
+
+from fasterguin.main import main as fasterguin_main
+from fasterguin.trace import TraceEvent, get_tracer
+
+from . import corpus
+
+STUBS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stubs")
+# low-etctool is the low profile with EtcTool instead of etcpak
+PROFILES = ["pc", "android", "low", "low-etctool"]
+MODES = ["cold", "warm"]
+
+
+class ToolCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, event: TraceEvent):
+        if event.category == "tool":
+            self.count = self.count + 1
+
+
+def get_default_backend():
+    try:
+        import numpy
+        import PIL
+    except ImportError:
+        return "magick"
+    return "pillow"
+
+
+def get_cpu_time():
+    # Including finished child processes (encoders, ImageMagick)
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def run_build(definition: str, output: str, cache: str | None, profile: str, jobs: int, extra: list[str]):
+    etctool = profile == "low-etctool"
+    argv = ["fasterguin", definition, output, "-p", "low" if etctool else profile, "-j", str(jobs)]
+    argv.extend(["--astcenc", os.path.join(STUBS_DIR, "astcenc")])
+    if profile == "low":
+        # etcpak is preferred by the low profile when it's specified
+        argv.extend(["--etcpak", os.path.join(STUBS_DIR, "etcpak")])
+    elif etctool:
+        argv.extend(["--etctool", os.path.join(STUBS_DIR, "EtcTool")])
+    argv.extend(["--love", os.path.join(STUBS_DIR, "love"), "--packer", STUBS_DIR])
+    if cache is None:
+        argv.append("--no-cache")
+    else:
+        argv.extend(["--cache-dir", cache])
+    argv.extend(extra)
+    # Real file as the encoders are given sys.stdout
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), hide_etcpak(etctool):
+        fasterguin_main(argv)
+
+
+@contextlib.contextmanager
+def hide_etcpak(hide: bool):
+    # etcpak found in PATH is used instead of EtcTool, so leave out the directories having it
+    path = os.environ.get("PATH")
+    if hide and path is not None:
+        directories = path.split(os.pathsep)
+        os.environ["PATH"] = os.pathsep.join(d for d in directories if shutil.which("etcpak", path=d) is None)
+    try:
+        yield
+    finally:
+        if path is not None:
+            os.environ["PATH"] = path
+
+
+def run_case(workdir: str, definition: str, profile: str, mode: str, jobs: int, repeat: int, extra: list[str]):
+    output = os.path.join(workdir, "output")
+    cache = os.path.join(workdir, "cache") if mode == "warm" else None
+    if cache is not None:
+        # Populate the cache first
+        shutil.rmtree(cache, True)
+        shutil.rmtree(output, True)
+        run_build(definition, output, cache, profile, jobs, extra)
+    counter = ToolCounter()
+    get_tracer().add_listener(counter)
+    wall = []  # type: list[float]
+    cpu = []  # type: list[float]
+    try:
+        for _ in range(repeat):
+            shutil.rmtree(output, True)
+            start_cpu = get_cpu_time()
+            start = time.perf_counter()
+            run_build(definition, output, cache, profile, jobs, extra)
+            wall.append(time.perf_counter() - start)
+            cpu.append(get_cpu_time() - start_cpu)
+    finally:
+        get_tracer().listeners.remove(counter)
+    return {
+        "wall": wall,
+        "cpu": cpu,
+        "median": statistics.median(wall),
+        "min": min(wall),
+        "tools": counter.count // repeat,
+    }
+
+
+def compare(results: dict, baseline_file: str, threshold: float):
+    # Returns number of regressions
+    with open(baseline_file, "r", encoding="UTF-8") as f:
+        baseline = json.load(f)["results"]
+    regressions = 0
+    print(f"{'case':<32} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["median"], result["median"]
+        change = (after - before) / before * 100 if before > 0 else 0
+        mark = ""
+        if change > threshold:
+            mark = " (regression)"
+            regressions = regressions + 1
+        print(f"{name:<32} {before:>9.3f}s {after:>9.3f}s {change:>+7.1f}%{mark}")
+    return regressions
+
+
+def main(arg: list[str]):
+    parser = argparse.ArgumentParser("benchmarks", description="Measure end-to-end builds with synthetic assets.")
+    parser.add_argument("-o", "--output", help="Results JSON file.", default="benchmark-results.json")
+    parser.add_argument("--compare", help="Compare against previous results JSON file.")
+    parser.add_argument("--threshold", help="Regression threshold in percent for --compare.", type=float, default=10)
+    parser.add_argument("--workdir", help="Directory for the corpus and outputs (default is temporary directory).")
+    parser.add_argument("-p", "--profiles", help="Comma-separated profiles.", default=",".join(PROFILES))
+    parser.add_argument("-s", "--scenarios", help="Comma-separated scenarios (images, resize, mipmap, atlas).")
+    parser.add_argument("-m", "--modes", help="Comma-separated cache modes (cold, warm).", default=",".join(MODES))
+    parser.add_argument("-j", "--jobs", help="Comma-separated job counts.", default="1")
+    parser.add_argument("-r", "--repeat", help="Number of measured runs for each case.", type=int, default=3)
+    parser.add_argument("--count", help="Number of images.", type=int, default=100)
+    parser.add_argument("--min-size", help="Minimum image dimension.", type=int, default=16)
+    parser.add_argument("--max-size", help="Maximum image dimension.", type=int, default=512)
+    parser.add_argument("--sprites", help="Number of images in the texture atlas.", type=int, default=100)
+    parser.add_argument("--sprite-size", help="Maximum dimension of atlas images.", type=int, default=64)
+    parser.add_argument("--seed", help="Random seed of the corpus.", type=int, default=1)
+    parser.add_argument("--image-backend", help="Image processing backend (default is pillow if installed).")
+    args, extra = parser.parse_known_args(arg[1:])
+    # Unknown arguments are passed to Faster Guin, e.g. --magick
+    backend = args.image_backend or get_default_backend()
+    extra = ["--image-backend", backend, *extra]
+    spec = corpus.CorpusSpec(args.count, args.min_size, args.max_size, args.sprites, args.sprite_size, args.seed)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="fasterguin-bench")
+    try:
+        print(f"Generating corpus in {workdir}")
+        definitions = corpus.generate(os.path.join(workdir, "corpus"), spec)
+        scenarios = args.scenarios.split(",") if args.scenarios else list(definitions.keys())
+        results = {}  # type: dict[str, dict]
+        for scenario in scenarios:
+            if scenario not in definitions:
+                raise Exception(f"Unknown scenario '{scenario}'")
+            for profile in args.profiles.split(","):
+                for mode in args.modes.split(","):
+                    for jobs in [int(j) for j in args.jobs.split(",")]:
+                        name = f"{scenario}/{profile}/{mode}/j{jobs}"
+                        result = run_case(workdir, definitions[scenario], profile, mode, jobs, args.repeat, extra)
+                        results[name] = result
+                        print(
+                            f"{name:<32} {result['median']:>8.3f}s (min {result['min']:.3f}s, {result['tools']} tools)"
+                        )
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, True)
+    with open(args.output, "w", encoding="UTF-8") as f:
+        json.dump(
+            {
+                "environment": {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "cpu_count": os.cpu_count(),
+                    "image_backend": backend,
+                    "arguments": extra,
+                },
+                "corpus": spec.to_dict(),
+                "repeat": args.repeat,
+                "results": results,
+            },
+            f,
+            indent="\t",
+        )
+    print(f"Writing {args.output}")
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) > 0 else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
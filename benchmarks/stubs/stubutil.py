@@ -0,0 +1,116 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Shared code of the stand-in executables. They follow the command line of the real programs and write
+# outputs of realistic size, but don't do any actual compression, so only the Python side is measured.
+
+import json
+import math
+import os
+import re
+import struct
+import sys
+
+KTX_IDENTIFIER = b"\xabKTX 11\xbb\r\n\x1a\n"
+GL_COMPRESSED_RGBA_ASTC_4x4_KHR = 0x93B0
+GL_COMPRESSED_RGBA8_ETC2_EAC = 0x9278
+
+
+def fail(message: str):
+    print(message, file=sys.stderr)
+    sys.exit(1)
+
+
+def png_size(path: str):
+    with open(path, "rb") as f:
+        header = f.read(24)
+    if header[:8] != b"\x89PNG\r\n\x1a\n" or header[12:16] != b"IHDR":
+        raise ValueError(f"{path}: not a PNG file")
+    return struct.unpack(">II", header[16:24])
+
+
+def write_ktx(path: str, width: int, height: int, internal_format: int, block: int, block_bytes: int, levels: int):
+    with open(path, "wb") as f:
+        f.write(KTX_IDENTIFIER)
+        f.write(struct.pack("<13I", 0x04030201, 0, 1, 0, internal_format, 0x1908, width, height, 0, 0, 1, levels, 0))
+        for _ in range(levels):
+            size = math.ceil(width / block) * math.ceil(height / block) * block_bytes
+            f.write(struct.pack("<I", size))
+            f.write(bytes(size))
+            width, height = max(width // 2, 1), max(height // 2, 1)
+
+
+def mipmap_count(width: int, height: int):
+    return int(math.log2(max(width, height))) + 1
+
+
+# Packer Guin emulation for the LOVE stand-in. Images are placed in rows and the atlas is empty.
+
+
+def pack(input: str, output: str, po2: bool, raw: str | None):
+    base = os.path.dirname(input)
+    atlas_output = "output"
+    size = 1024
+    prefix = ""
+    files = []  # type: list[str]
+    with open(input, "r", encoding="UTF-8") as f:
+        for line in f:
+            match = re.match(r"(\w+)\s+(.+)", line.strip())
+            if match is None:
+                continue
+            command, data = match.group(1).lower(), match.group(2)
+            if command == "output":
+                atlas_output = data
+            elif command == "size":
+                size = int(data)
+            elif command == "prefix":
+                prefix = data if data.endswith("/") else data + "/"
+            elif command == "file":
+                files.append(data)
+            elif command == "folder":
+                folder = data if data.endswith("/") else data + "/"
+                for name in sorted(os.listdir(os.path.join(base, data))):
+                    if name.endswith(".png"):
+                        files.append(folder + name)
+    viewports = {}
+    x = y = row = width = 0
+    for file in files:
+        w, h = png_size(os.path.join(base, file))
+        if x + w > size:
+            x, y, row = 0, y + row, 0
+        viewports[prefix + file] = [x, y, w, h]
+        x, row, width = x + w, max(row, h), max(width, x + w)
+    height = y + row
+    if height > size:
+        raise ValueError(f"Images don't fit in {size}x{size} atlas")
+    if po2:
+        width = height = 2 ** math.ceil(math.log2(max(width, height, 1)))
+    output_path = os.path.join(output, atlas_output)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path + ".json", "w", encoding="UTF-8") as f:
+        json.dump(viewports, f)
+    page = {"output": output_path, "width": width, "height": height}
+    if raw is not None:
+        with open(raw, "wb") as f:
+            f.write(bytes(width * height * 4))
+        page["raw"] = raw
+    else:
+        raise ValueError("Only raw atlas output is supported")
+    return {"json": output_path + ".json", "pages": [page]}
@@ -18,6 +18,8 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
+from .backends import BACKEND_LIST
 from .commands import COMMAND_LIST
 from .options import OPTION_LIST
+from .packers import PACKER_LIST
 from .profiles import PROFILE_LIST
@@ -18,11 +18,16 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
-import json
 import os
 
-from . import utils
+from . import metadata, utils
+from .cache import BuildCache
+from .dedupe import DuplicateIndex
 from .profiles.base import Profile
+from .scanindex import ScanIndex
+from .sync import SyncIndex
+
+from typing import Any
 
 
 class Asset:
@@ -33,8 +38,22 @@ class Asset:
         self.profile = profile
         self.real_sizes = {}
         self.real_size_out = "metadata.json"
+        self.real_size_format = "json"
+        # Everything about each image, written only if requested
+        self.manifest = {}  # type: dict[str, dict[str, Any]]
+        self.manifest_out = None  # type: str | None
+        self.manifest_format = "json"
         self.registered_images = set()
         self.mipmapping = False
+        self.quality = "final"
+        self.cache = None  # type: BuildCache | None
+        self.scan_index = ScanIndex()
+        self.sync_index = SyncIndex()
+        self.prune = False
+        self.duplicates = None  # type: DuplicateIndex | None
+        # Images registered by each command, so they can be removed when the command is run again.
+        self.owner = None  # type: object | None
+        self.owned_images = {}  # type: dict[object, list[str]]
 
     def set_input_directory(self, path: str):
         self.input = os.path.abspath(path)
@@ -86,17 +105,77 @@ class Asset:
             return False
         else:
             self.registered_images.add(fullimage)
+            if self.owner is not None:
+                self.owned_images.setdefault(self.owner, []).append(fullimage)
 
-    def add_real_size(self, image: str, ow: int, oh: int, w: int, h: int):
-        path = self.prefix + image
+    def add_real_size(
+        self,
+        image: str,
+        ow: int,
+        oh: int,
+        w: int,
+        h: int,
+        prefix: str | None = None,
+        alias: str | None = None,
+        quality: str = "final",
+    ):
+        path = (self.prefix if prefix is None else prefix) + image
         self.real_sizes[path] = [ow, oh, w, h]
+        if alias is not None:
+            # Same pixels as other image, which is the one that's actually written.
+            self.real_sizes[path].append(alias)
+        if quality in ("draft", "normal"):
+            # Not encoded for release
+            self.real_sizes[path].append({"quality": quality})
         self.register_image(path)
 
+    def add_manifest_entry(
+        self,
+        path: str,
+        texture: str,
+        size: list[int],
+        padded: list[int],
+        viewport: list[int],
+        mipmaps: int,
+        trim: list[int] | None = None,
+    ):
+        entry = {"texture": texture, "size": size, "padded": padded, "viewport": viewport, "mipmaps": mipmaps}
+        if trim is not None:
+            entry["trim"] = trim
+        self.manifest[path] = entry
+
+    def reset_state(self):
+        # State set by the commands, which are run again in order on rebuild
+        self.prefix = ""
+        self.real_size_out = "metadata.json"
+        self.real_size_format = "json"
+        self.manifest_out = None
+        self.manifest_format = "json"
+        self.mipmapping = False
+        if self.duplicates is not None:
+            self.duplicates.reset()
+
+    def set_owner(self, owner: object | None):
+        self.owner = owner
+
+    def forget_images(self, owner: object):
+        for path in self.owned_images.pop(owner, []):
+            self.real_sizes.pop(path, None)
+            self.manifest.pop(path, None)
+            self.registered_images.discard(path)
+
+    def sort_real_sizes(self, owners: list[object]):
+        # Order the metadata and the manifest as if the commands are run in this order.
+        paths = [path for owner in owners for path in self.owned_images.get(owner, [])]
+        self.real_sizes = sort_by_paths(self.real_sizes, paths)
+        self.manifest = sort_by_paths(self.manifest, paths)
+
     def dump_real_size(self, f):
+        # f must be opened in binary mode
         if f != None:
-            json.dump(self.real_sizes, f, indent="\t", ensure_ascii=False)
+            metadata.dump(self.real_sizes, f, self.real_size_format)
         else:
-            return json.dumps(self.real_sizes, indent="\t", ensure_ascii=False)
+            return metadata.dumps(self.real_sizes, self.real_size_format)
 
     def get_realsize_output(self):
         return self.real_size_out
@@ -104,8 +183,80 @@ class Asset:
     def set_realsize_output(self, out: str):
         self.real_size_out = out
 
+    def get_realsize_format(self):
+        return self.real_size_format
+
+    def set_realsize_format(self, format: str):
+        self.real_size_format = format
+
+    def dump_manifest(self, f):
+        # f must be opened in binary mode
+        if f != None:
+            metadata.dump(self.manifest, f, self.manifest_format)
+        else:
+            return metadata.dumps(self.manifest, self.manifest_format)
+
+    def get_manifest_output(self):
+        return self.manifest_out
+
+    def set_manifest_output(self, out: str | None):
+        self.manifest_out = out
+
+    def get_manifest_format(self):
+        return self.manifest_format
+
+    def set_manifest_format(self, format: str):
+        self.manifest_format = format
+
     def get_mipmap(self):
         return self.mipmapping
 
     def enable_mipmap(self):
         self.mipmapping = True
+
+    def get_quality(self):
+        return self.quality
+
+    def set_quality(self, quality: str):
+        self.quality = quality
+
+    def get_cache(self):
+        return self.cache
+
+    def set_cache(self, cache: BuildCache | None):
+        self.cache = cache
+
+    def get_duplicate_index(self):
+        return self.duplicates
+
+    def enable_dedupe(self):
+        if self.duplicates is None:
+            self.duplicates = DuplicateIndex()
+
+    def get_scan_index(self):
+        return self.scan_index
+
+    def set_scan_index(self, scan_index: ScanIndex):
+        self.scan_index = scan_index
+
+    def get_sync_index(self):
+        return self.sync_index
+
+    def set_sync_index(self, sync_index: SyncIndex):
+        self.sync_index = sync_index
+
+    def get_prune(self):
+        return self.prune
+
+    def set_prune(self, prune: bool):
+        self.prune = prune
+
+
+def sort_by_paths(data: dict[str, Any], paths: list[str]):
+    result = {}
+    for path in paths:
+        if path in data:
+            result[path] = data[path]
+    for path, value in data.items():
+        result.setdefault(path, value)
+    return result
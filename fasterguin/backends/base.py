@@ -0,0 +1,59 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+from typing import TYPE_CHECKING, Dict, List
+
+if TYPE_CHECKING:
+    from ..profiles.base import TransformPipeline
+
+
+class RawImage:
+    # Uncompressed RGBA8 pixels, row by row. Used to pass images around without PNG encoding.
+    def __init__(self, width: int, height: int, data: bytes | memoryview):
+        self.width = width
+        self.height = height
+        self.data = memoryview(data).cast("B")
+        if len(self.data) != width * height * 4:
+            raise Exception(f"Raw image size mismatch, expected {width}x{height} RGBA8")
+
+    def get_size(self):
+        return self.width, self.height
+
+
+class ImageBackend:
+    def __init__(self, opts: Dict[str, str]):
+        pass
+
+    def run_pipeline(self, image: "bytes | RawImage", pipeline: "TransformPipeline") -> List[bytes]:
+        # Implementation must override this. Returns PNG for each of pipeline.get_output_sizes()
+        raise NotImplementedError("image backend is not implemented")
+
+    def run_pipeline_raw(self, image: "bytes | RawImage", pipeline: "TransformPipeline") -> RawImage:
+        # Implementation must override this. Returns the pixels after the pipeline operations, without mipmaps.
+        raise NotImplementedError("image backend is not implemented")
+
+    def get_pixel_hash(self, image: bytes) -> str:
+        # Implementation must override this. Returns hash of the decoded pixels, so images which are
+        # encoded differently but look the same have same hash.
+        raise NotImplementedError("image backend is not implemented")
+
+    def get_identity(self) -> str:
+        # Used to invalidate cached results when the backend changes
+        return type(self).__name__
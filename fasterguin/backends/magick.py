@@ -0,0 +1,92 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+
+from .. import scratch, tools, utils
+from .base import ImageBackend, RawImage
+
+from typing import TYPE_CHECKING, Dict, List
+
+if TYPE_CHECKING:
+    from ..profiles.base import TransformPipeline
+
+
+class MagickBackend(ImageBackend):
+    def __init__(self, opts: Dict[str, str]):
+        ImageBackend.__init__(self, opts)
+        # Need ImageMagick
+        self.magick = utils.get_program(opts, "magick")
+        if self.magick == None:
+            raise Exception("ImageMagick not found")
+
+    def run_pipeline(self, image: bytes | RawImage, pipeline: "TransformPipeline"):
+        outputs = pipeline.get_output_sizes()
+        if len(outputs) == 1:
+            return [self.run_magick(image, self.get_arguments(pipeline, ["png:-"]))]
+        with scratch.get_scratch().directory() as tempdir:
+            files = [os.path.join(tempdir, f"{i}.png") for i in range(len(outputs))]
+            self.run_magick(image, self.get_arguments(pipeline, [f"png:{f}" for f in files]))
+            result = []
+            for file in files:
+                with open(file, "rb") as f:
+                    result.append(f.read())
+            return result
+
+    def run_pipeline_raw(self, image: bytes | RawImage, pipeline: "TransformPipeline"):
+        width, height = pipeline.get_size()
+        return RawImage(width, height, self.run_magick(image, self.get_arguments(pipeline, ["rgba:-"])))
+
+    def get_pixel_hash(self, image: bytes):
+        # Image signature is SHA-256 of the pixels
+        result = tools.get_tool_runner().run("magick", [self.magick, "identify", "-format", "%wx%h:%#", "png:-"], image)
+        return str(result, "UTF-8").strip()
+
+    def get_identity(self):
+        return utils.get_program_identity(self.magick)
+
+    def run_magick(self, image: bytes | RawImage, arguments: List[str]):
+        if isinstance(image, RawImage):
+            input = ["-size", f"{image.width}x{image.height}", "-depth", "8", "rgba:-"]
+            image = image.data
+        else:
+            input = ["png:-"]
+        return tools.get_tool_runner().run("magick", [self.magick, "convert", *input, *arguments], image)
+
+    def get_arguments(self, pipeline: "TransformPipeline", outputs: List[str]):
+        result = []  # type: List[str]
+        for op, width, height in pipeline.get_operations():
+            if op == "resize":
+                result.extend(["-resize", f"{width}x{height}!"])
+            elif op == "extent":
+                result.extend(["-background", "transparent", "-gravity", "northwest", "-extent", f"{width}x{height}"])
+        result.extend(["-depth", "8"])
+        sizes = pipeline.get_output_sizes()
+        if pipeline.is_mipmap_from_base() and len(sizes) > 1:
+            # Keep the base level in memory and resize it for each level.
+            result.extend(["-write", "mpr:base"])
+            for i in range(len(sizes) - 1):
+                result.extend(["-write", outputs[i], "+delete", "mpr:base", "-resize", "{}x{}!".format(*sizes[i + 1])])
+        else:
+            # Mipmaps are made by resizing the previous level, writing each level along the way.
+            for i in range(len(sizes) - 1):
+                result.extend(["-write", outputs[i], "-resize", "{}x{}!".format(*sizes[i + 1])])
+        result.append(outputs[-1])
+        return result
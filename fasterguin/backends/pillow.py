@@ -0,0 +1,123 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import hashlib
+import io
+
+from .base import ImageBackend, RawImage
+
+from typing import TYPE_CHECKING, Dict
+
+if TYPE_CHECKING:
+    from ..profiles.base import TransformPipeline
+
+try:
+    import numpy
+    import PIL
+    import PIL.Image
+except ImportError:
+    numpy = None
+    PIL = None
+
+
+class PillowBackend(ImageBackend):
+    def __init__(self, opts: Dict[str, str]):
+        ImageBackend.__init__(self, opts)
+        if numpy is None or PIL is None:
+            raise Exception("Pillow and NumPy are required for pillow image backend")
+
+    def run_pipeline(self, image: bytes | RawImage, pipeline: "TransformPipeline"):
+        # Image is kept as RGBA array between operations and only encoded to PNG at the end.
+        pixels = self.transform(self.decode(image), pipeline)
+        levels = [pixels]
+        for width, height in pipeline.get_output_sizes()[1:]:
+            if pipeline.is_mipmap_from_base():
+                levels.append(resize(pixels, width, height))
+            else:
+                levels.append(downsample(levels[-1], width, height))
+        return [self.encode(level) for level in levels]
+
+    def run_pipeline_raw(self, image: bytes | RawImage, pipeline: "TransformPipeline"):
+        pixels = numpy.ascontiguousarray(self.transform(self.decode(image), pipeline))
+        return RawImage(pixels.shape[1], pixels.shape[0], pixels)
+
+    def transform(self, pixels: "numpy.ndarray", pipeline: "TransformPipeline"):
+        for op, width, height in pipeline.get_operations():
+            if op == "resize":
+                pixels = resize(pixels, width, height)
+            elif op == "extent":
+                pixels = extent(pixels, width, height)
+        return pixels
+
+    def get_pixel_hash(self, image: bytes):
+        pixels = self.decode(image)
+        h = hashlib.sha256(pixels.tobytes())
+        h.update(repr(pixels.shape).encode("UTF-8"))
+        return h.hexdigest()
+
+    def get_identity(self):
+        return f"pillow:{PIL.__version__}:numpy:{numpy.__version__}"
+
+    def decode(self, image: bytes | RawImage):
+        if isinstance(image, RawImage):
+            return numpy.frombuffer(image.data, numpy.uint8).reshape(image.height, image.width, 4)
+        with PIL.Image.open(io.BytesIO(image)) as img:
+            return numpy.asarray(img.convert("RGBA"))
+
+    def encode(self, pixels: "numpy.ndarray"):
+        result = io.BytesIO()
+        PIL.Image.fromarray(pixels, "RGBA").save(result, "PNG")
+        return result.getvalue()
+
+
+def resize(pixels: "numpy.ndarray", width: int, height: int):
+    # Pillow resamples RGBA with premultiplied alpha.
+    img = PIL.Image.fromarray(pixels, "RGBA").resize((width, height), PIL.Image.Resampling.LANCZOS)
+    return numpy.asarray(img)
+
+
+def extent(pixels: "numpy.ndarray", width: int, height: int):
+    result = numpy.zeros((height, width, 4), numpy.uint8)
+    h = min(height, pixels.shape[0])
+    w = min(width, pixels.shape[1])
+    result[:h, :w] = pixels[:h, :w]
+    return result
+
+
+def downsample(pixels: "numpy.ndarray", width: int, height: int):
+    fy, ry = divmod(pixels.shape[0], height)
+    fx, rx = divmod(pixels.shape[1], width)
+    if ry != 0 or rx != 0 or fy > 2 or fx > 2:
+        # Odd dimensions, no exact box filter.
+        return resize(pixels, width, height)
+    # Alpha-weighted box filter over each fx*fy block
+    blocks = pixels.reshape(height, fy, width, fx, 4).astype(numpy.uint32)
+    alpha = blocks[..., 3].sum((1, 3))
+    color = (blocks[..., :3] * blocks[..., 3:]).sum((1, 3))
+    count = fx * fy
+    result = numpy.empty((height, width, 4), numpy.uint8)
+    opaque = alpha[..., None] > 0
+    # Fully transparent blocks has no weight, use plain average of their colors.
+    average = blocks[..., :3].sum((1, 3))
+    result[..., :3] = numpy.where(
+        opaque, (color + alpha[..., None] // 2) // numpy.maximum(alpha, 1)[..., None], (average + count // 2) // count
+    )
+    result[..., 3] = (alpha + count // 2) // count
+    return result
@@ -0,0 +1,123 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from . import utils
+from .trace import get_tracer
+
+from typing import Any
+
+CACHE_VERSION = "4"
+ENTRY_FILE = "entry.json"
+
+
+class BuildCache:
+    def __init__(self, path: str, max_size: int):
+        self.path = os.path.abspath(path)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        utils.rmkdir(self.path)
+
+    def get_path(self):
+        return self.path
+
+    def get_stats(self):
+        return self.hits, self.misses
+
+    def make_key(self, *parts: str | bytes):
+        h = hashlib.sha256(CACHE_VERSION.encode("UTF-8"))
+        for part in parts:
+            if isinstance(part, str):
+                part = part.encode("UTF-8")
+            # Length prefix so ("ab", "c") and ("a", "bc") don't collide
+            h.update(len(part).to_bytes(8, "little"))
+            h.update(part)
+        return h.hexdigest()
+
+    def get_entry_path(self, key: str):
+        return os.path.join(self.path, key[:2], key)
+
+    def restore_entry(self, key: str, destwoext: str) -> dict[str, Any] | None:
+        # Copies the cached files to destwoext. Returns the stored data and the list of restored file suffixes.
+        entry_path = self.get_entry_path(key)
+        try:
+            with open(os.path.join(entry_path, ENTRY_FILE), "r", encoding="UTF-8") as f:
+                entry = json.load(f)
+            for i, suffix in enumerate(entry["files"]):
+                shutil.copyfile(os.path.join(entry_path, str(i)), destwoext + suffix)
+                get_tracer().file_written(destwoext + suffix)
+            # Mark as recently used
+            os.utime(os.path.join(entry_path, ENTRY_FILE))
+        except (OSError, ValueError, KeyError):
+            with self.lock:
+                self.misses = self.misses + 1
+            return None
+        with self.lock:
+            self.hits = self.hits + 1
+        return entry
+
+    def store(self, key: str, destwoext: str, suffixes: list[str], data: Any):
+        entry_path = self.get_entry_path(key)
+        utils.rmkdir(os.path.dirname(entry_path))
+        # Populate in temporary directory first then rename it, so concurrent jobs and
+        # interrupted builds never leave partial entry.
+        temp_path = tempfile.mkdtemp(".tmp", "entry", os.path.dirname(entry_path))
+        try:
+            for i, suffix in enumerate(suffixes):
+                shutil.copyfile(destwoext + suffix, os.path.join(temp_path, str(i)))
+            with open(os.path.join(temp_path, ENTRY_FILE), "w", encoding="UTF-8") as f:
+                json.dump({"files": suffixes, "data": data}, f)
+            os.rename(temp_path, entry_path)
+        except OSError:
+            # Entry already exists or output is missing
+            shutil.rmtree(temp_path, True)
+
+    def evict(self):
+        entries = []  # type: list[tuple[int, int, str]]
+        total = 0
+        for shard in os.scandir(self.path):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.is_dir():
+                    continue
+                try:
+                    size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                    mtime = os.stat(os.path.join(entry.path, ENTRY_FILE)).st_mtime_ns
+                except OSError:
+                    # Incomplete or stale temporary entry
+                    size, mtime = 0, 0
+                entries.append((mtime, size, entry.path))
+                total = total + size
+        # Least recently used first
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_size and mtime != 0:
+                break
+            shutil.rmtree(path, True)
+            total = total - size
@@ -23,6 +23,7 @@ from .copyf import CopyFileCommand
 from .enable import EnableCommand
 from .file import FileCommand
 from .folder import FolderCommand
+from .manifest import ManifestCommand
 from .output import OutputCommand
 from .pack import PackCommand
 from .prefix import PrefixCommand
@@ -33,6 +34,7 @@ COMMAND_LIST = {
     "enable": EnableCommand,
     "file": FileCommand,
     "folder": FolderCommand,
+    "manifest": ManifestCommand,
     "output": OutputCommand,
     "pack": PackCommand,
     "prefix": PrefixCommand,
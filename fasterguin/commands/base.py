@@ -21,11 +21,29 @@
 from ..asset import Asset
 from ..options.base import Option, UnsupportedOption
 
-from typing import TypeVar
+from typing import Any, Callable, TypeVar
 
 T = TypeVar("T")
 
 
+class Job:
+    def __init__(
+        self,
+        run: Callable[[], Any],
+        commit: Callable[[Asset, Any], None] | None = None,
+        key: str | None = None,
+    ):
+        # run() is called from worker thread and must not modify the Asset.
+        # commit() is called from main thread in the build plan order.
+        # key is the output path the job writes. Jobs writing same path, or inside it, run in the plan order.
+        self.run = run
+        self.commit = commit
+        self.key = key
+
+    def get_key(self):
+        return self.key
+
+
 class Command:
     def __init__(self, value: str):
         self.options = {}
@@ -47,5 +65,19 @@ class Command:
     def get_option(self, option: type[T]) -> T | None:
         return self.options.get(option)
 
+    def plan(self, context: Asset) -> list[Job]:
+        # Commands which only change the build state apply it immediately.
+        self.execute(context)
+        return []
+
     def execute(self, context: Asset):
         pass
+
+    def get_dependencies(self, context: Asset) -> list[str]:
+        # Input files and directories the command reads. Commands without any only change the
+        # build state and are run again on every rebuild in watch mode.
+        return []
+
+    def uses_duplicate_index(self) -> bool:
+        # Commands whose images may be aliased to each other with "enable dedupe"
+        return False
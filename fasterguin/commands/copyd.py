@@ -18,15 +18,24 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
-import shutil
-
+from .. import sync
 from ..asset import Asset
-from .base import Command
+from .base import Command, Job
 
 
 class CopyDirectoryCommand(Command):
-    def execute(self, context: Asset):
+    def get_dependencies(self, context: Asset):
+        return [context.get_input_path(self.value)]
+
+    def plan(self, context: Asset):
+        return [Job(lambda: self.copy(context), None, context.get_output_path(self.value))]
+
+    def copy(self, context: Asset):
         inpath = context.get_input_path(self.value)
         outpath = context.get_output_path(self.value)
-        print(f"Copying {self.value}")
-        shutil.copytree(inpath, outpath, False, dirs_exist_ok=True)
+        # Only the changed files are copied
+        copied, total, removed = sync.sync_directory(inpath, outpath, context.get_sync_index(), context.get_prune())
+        message = f"Copying {self.value} ({copied} of {total} file(s) changed"
+        if removed > 0:
+            message = message + f", {removed} removed"
+        print(message + ")")
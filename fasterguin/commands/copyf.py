@@ -19,18 +19,25 @@
 # DEALINGS IN THE SOFTWARE.
 
 import os
-import shutil
 
-from .. import utils
+from .. import sync, utils
 from ..asset import Asset
-from .base import Command
+from .base import Command, Job
 
 
 class CopyFileCommand(Command):
-    def execute(self, context: Asset):
+    def get_dependencies(self, context: Asset):
+        return [context.get_input_path(self.value)]
+
+    def plan(self, context: Asset):
+        return [Job(lambda: self.copy(context), None, context.get_output_path(self.value))]
+
+    def copy(self, context: Asset):
         infile = context.get_input_path(self.value)
         outfile = context.get_output_path(self.value)
         outpath = os.path.dirname(outfile)
         utils.rmkdir(outpath)
-        print(f"Copying {self.value}")
-        shutil.copyfile(infile, outfile, follow_symlinks=True)
+        if sync.sync_file(infile, outfile):
+            print(f"Copying {self.value}")
+        else:
+            print(f"Copying {self.value} (unchanged)")
@@ -31,5 +31,7 @@ class EnableCommand(Command):
     def execute(self, context: Asset):
         if self.value == "mipmap":
             context.enable_mipmap()
+        elif self.value == "dedupe":
+            context.enable_dedupe()
         elif self.value == "zopfli":
             raise Exception("placeholder")
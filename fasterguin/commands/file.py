@@ -22,53 +22,156 @@ import os
 
 from .. import utils
 from ..asset import Asset
+from ..backends.base import RawImage
+from ..dedupe import DuplicateIndex
+from ..intermediates import get_intermediates
 from ..options.dimension import DimensionOption
 from ..options.mipmap import MipmapOption
+from ..options.mipmode import MipmapModeOption
+from ..options.quality import QualityOption
 from ..options.resize import ResizeOption
+from ..profiles.base import TransformPipeline
+from ..trace import get_tracer
 
-from .base import Command
+from .base import Command, Job
 
 
 class FileCommand(Command):
     def __init__(self, value: str):
         Command.__init__(self, value)
         self.outdir_override = None
+        self.dimensions = None  # type: tuple[int, int] | None
 
     def set_output_override(self, outdir_override: str):
         self.outdir_override = outdir_override
 
+    def set_dimensions(self, dimensions: tuple[int, int] | None):
+        # Image dimensions already known from directory scan
+        self.dimensions = dimensions
+
     def get_output_filename(self):
         if self.outdir_override != None:
             return self.outdir_override + os.path.basename(self.value)
         else:
             return self.value
 
+    def get_dependencies(self, context: Asset):
+        return [context.get_input_path(self.value)]
+
+    def uses_duplicate_index(self):
+        return True
+
     def accept_option(self, option: type):
-        return option == DimensionOption or option == ResizeOption
+        return option in (DimensionOption, ResizeOption, MipmapOption, MipmapModeOption, QualityOption)
 
-    def execute(self, context: Asset):
-        dimension = self.get_option(DimensionOption)
-        resize = self.get_option(ResizeOption)
+    def plan(self, context: Asset):
         mips = self.get_option(MipmapOption)
+        mipmap = mips.get_mipmap() if mips is not None else context.get_mipmap()
+        quality = self.get_option(QualityOption)
+        quality = quality.get_quality() if quality is not None else context.get_quality()
+        prefix = context.get_prefix()
+        out = self.get_output_filename()
+        duplicates = context.get_duplicate_index()
+
+        def commit(context: Asset, result: tuple[tuple[int, ...], list[str], str | None, tuple[str, list[str]] | None]):
+            sizes, suffixes, key, source = result
+            alias = None
+            if key is not None and duplicates is not None:
+                alias = duplicates.commit(key, prefix + out)
+                if alias is None and source is not None:
+                    # First image in the plan order, but the files were written by its duplicate.
+                    outwoext, _ = os.path.splitext(context.get_output_path(out))
+                    utils.rmkdir(os.path.dirname(outwoext))
+                    for suffix in source[1]:
+                        os.replace(source[0] + suffix, outwoext + suffix)
+            ow, oh, rw, rh, w, h = sizes
+            context.add_real_size(out, ow, oh, rw, rh, prefix=prefix, alias=alias, quality=quality)
+            texture = os.path.splitext(prefix + out if alias is None else alias)[0] + suffixes[0]
+            mipmaps = len(utils.calculate_mipmaps(w, h)) + 1 if mipmap else 1
+            context.add_manifest_entry(prefix + out, texture, [ow, oh, rw, rh], [w, h], [0, 0, rw, rh], mipmaps)
+
+        job = Job(lambda: self.process(context, out, mipmap, quality, duplicates), commit, context.get_output_path(out))
+        return [job]
+
+    def process(self, context: Asset, out: str, mipmap: bool, quality: str, duplicates: DuplicateIndex | None):
+        intermediates = get_intermediates()
+        if intermediates is None:
+            png = self.read(context)
+        else:
+            png = intermediates.get(("read", self.value), lambda: self.read(context))
+        outwoext, _ = os.path.splitext(context.get_output_path(out))
+        if duplicates is None:
+            sizes, suffixes = self.encode(context, png, outwoext, mipmap, quality)
+            return sizes, suffixes, None, None
+        # Images with same pixels and options are encoded once, the rest refer to it.
+        key = "\0".join(
+            [
+                duplicates.get_pixel_hash(png, context.get_profile().get_pixel_hash),
+                *sorted(opt.get_name() + "=" + opt.get_value() for opt in self.options.values()),
+                str(mipmap),
+                quality,
+            ]
+        )
+        (sizes, suffixes), writer = duplicates.process(
+            key, outwoext, lambda: self.encode(context, png, outwoext, mipmap, quality)
+        )
+        if writer == outwoext:
+            return sizes, suffixes, key, None
+        print(f"Processing {self.value} (duplicate)")
+        return sizes, suffixes, key, (writer, suffixes)
+
+    def read(self, context: Asset):
         with open(context.get_input_path(self.value), "rb") as f:
-            png = f.read()
+            return f.read()
+
+    def encode(self, context: Asset, png: bytes, outwoext: str, mipmap: bool, quality: str):
+        dimension = self.get_option(DimensionOption)
+        resize = self.get_option(ResizeOption)
         profile = context.get_profile()
+        utils.rmkdir(os.path.dirname(outwoext))
+        cache = context.get_cache()
+        if cache is not None:
+            key = cache.make_key(
+                png,
+                *profile.get_cache_identity(),
+                *sorted(opt.get_name() + "=" + opt.get_value() for opt in self.options.values()),
+                str(mipmap),
+                quality,
+            )
+            entry = cache.restore_entry(key, outwoext)
+            if entry is not None:
+                print(f"Processing {self.value} (cached)")
+                return tuple(entry["data"]), entry["files"]
         print(f"Processing {self.value}")
-        cw, ch = utils.size_probe(png)
+        cw, ch = self.dimensions or utils.size_probe(png)
         ow, oh = cw, ch
         rw, rh = cw, ch
+        # Resize is done along with the profile operations in single pass
+        pipeline = TransformPipeline(cw, ch)
+        image = png  # type: bytes | RawImage
         if resize != None:
             rw, rh = resize.compute_size(cw, ch)
-            png = profile.run_resize(png, rw, rh)
+            pipeline.resize(rw, rh)
+            intermediates = get_intermediates()
+            if intermediates is not None:
+                # Building several profiles, resize once for all of them
+                image = intermediates.get_for(png, ("resize", rw, rh), lambda: profile.run_pipeline_raw(png, pipeline))
+                pipeline = TransformPipeline(rw, rh)
+        mipmode = self.get_option(MipmapModeOption)
+        if mipmode is not None:
+            pipeline.set_mipmap_from_base(mipmode.is_from_base())
         if dimension == None:
             ow, oh = rw, rh
         else:
             dimensions = dimension.get_dimensions()
             if dimensions != None:
                 ow, oh = dimensions[0], dimensions[1]
-        out = self.get_output_filename()
-        outpath = context.get_output_path(out)
-        utils.rmkdir(os.path.dirname(outpath))
-        outwoext, _ = os.path.splitext(outpath)
-        profile.run_compressor(png, outwoext, mips.get_mipmap() if mips is not None else context.get_mipmap())
-        context.add_real_size(out, ow, oh, rw, rh)
+        tracer = get_tracer()
+        with tracer.span("compress", "stage", input=self.value):
+            w, h = profile.run_compressor(image, outwoext, mipmap, pipeline, quality)
+        suffixes = profile.get_output_suffixes(w, h, mipmap)
+        for suffix in suffixes:
+            tracer.file_written(outwoext + suffix)
+        if cache is not None:
+            cache.store(key, outwoext, suffixes, [ow, oh, rw, rh, w, h])
+        return (ow, oh, rw, rh, w, h), suffixes
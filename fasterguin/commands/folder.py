@@ -18,19 +18,22 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
-import os
-
-from .. import utils
 from ..asset import Asset
+from ..globs import is_included
 from ..options.destination import DestinationOption
 from ..options.dimension import DimensionOption
+from ..options.exclude import ExcludeOption
+from ..options.include import IncludeOption
 from ..options.mipmap import MipmapOption
+from ..options.mipmode import MipmapModeOption
+from ..options.quality import QualityOption
+from ..options.recursive import RecursiveOption
 from ..options.resize import ResizeOption
 
-from .base import Command
+from .base import Command, Job
 from .file import FileCommand
 
-OPTS_LIST = (DimensionOption, ResizeOption, MipmapOption)
+OPTS_LIST = (DimensionOption, ResizeOption, MipmapOption, MipmapModeOption, QualityOption)
 
 
 class FolderCommand(Command):
@@ -43,23 +46,36 @@ class FolderCommand(Command):
         else:
             self.value = v
 
+    def get_dependencies(self, context: Asset):
+        return [context.get_input_path(self.value[:-1])]
+
+    def uses_duplicate_index(self):
+        return True
+
     def accept_option(self, option: type):
-        return option is DestinationOption or option in OPTS_LIST
+        return option in (DestinationOption, RecursiveOption, IncludeOption, ExcludeOption) or option in OPTS_LIST
 
-    def execute(self, context: Asset):
-        files = []
+    def plan(self, context: Asset):
+        jobs = []  # type: list[Job]
         dest = self.get_option(DestinationOption)
+        recursive = self.get_option(RecursiveOption)
+        include = self.get_option(IncludeOption)
+        exclude = self.get_option(ExcludeOption)
+        include_globs = include.get_globs() if include is not None else None
+        exclude_globs = exclude.get_globs() if exclude is not None else None
         input_path = context.get_input_path(self.value)
-        for _, _, f in os.walk(input_path):
-            files.extend(f)
-            break
-        for f in files:
-            if utils.is_valid_image(os.path.join(input_path, f)):
-                cmd = FileCommand(self.value + f)
+        # Whole tree is scanned at once and all of its images are planned together
+        entries = context.get_scan_index().scan(input_path, recursive is not None and recursive.is_recursive())
+        for entry in entries:
+            if entry.is_valid_image() and is_included(entry.name, include_globs, exclude_globs):
+                cmd = FileCommand(self.value + entry.name)
+                cmd.set_dimensions(entry.get_dimensions())
                 for opt in OPTS_LIST:
                     opt_data = self.get_option(opt)
                     if opt_data != None:
                         cmd.add_option(opt_data)
                 if dest != None:
-                    cmd.set_output_override(dest.get_value())
-                cmd.execute(context)
+                    # Subdirectories are kept under the destination
+                    cmd.set_output_override(dest.get_value() + entry.name[: entry.name.rfind("/") + 1])
+                jobs.extend(cmd.plan(context))
+        return jobs
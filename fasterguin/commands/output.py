@@ -19,10 +19,16 @@
 # DEALINGS IN THE SOFTWARE.
 
 from ..asset import Asset
+from ..options.format import FormatOption
 
 from .base import Command
 
 
 class OutputCommand(Command):
+    def accept_option(self, option: type):
+        return option is FormatOption
+
     def execute(self, context: Asset):
         context.set_realsize_output(self.value)
+        format = self.get_option(FormatOption)
+        context.set_realsize_format("json" if format is None else format.get_format())
@@ -18,29 +18,112 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
+import os
+import re
+import shutil
+
+from .. import utils
 from ..asset import Asset
+from ..intermediates import get_intermediates
 from ..options.algorithm import AlgorithmOption
 from ..options.mipmap import MipmapOption
+from ..options.mipmode import MipmapModeOption
+from ..options.quality import QualityOption
+from ..trace import get_tracer
+
+from .base import Command, Job
 
-from .base import Command
+
+# Same as the command pattern of Packer Guin input
+PACK_COMMAND_MATCH = re.compile(r"([A-Za-z]+)\s+(.+)")
 
 
 class PackCommand(Command):
     def accept_option(self, option: type):
-        return option in (AlgorithmOption, MipmapOption)
+        return option in (AlgorithmOption, MipmapOption, MipmapModeOption, QualityOption)
 
-    def execute(self, context: Asset):
-        algo = self.get_option(AlgorithmOption)
+    def get_dependencies(self, context: Asset):
+        path = context.get_input_path(self.value)
+        result = [path]
+        try:
+            with open(path, "r", encoding="UTF-8") as f:
+                for line in f:
+                    match = re.search(PACK_COMMAND_MATCH, line.rstrip("\r\n"))
+                    if match is not None and match.group(1).lower() in ("file", "folder"):
+                        name = match.group(2).rstrip("/\\")
+                        result.append(os.path.normpath(os.path.join(os.path.dirname(path), name)))
+        except OSError:
+            pass
+        return result
+
+    def plan(self, context: Asset):
         mips = self.get_option(MipmapOption)
+        mipmap = mips.get_mipmap() if mips is not None else context.get_mipmap()
+        quality = self.get_option(QualityOption)
+        quality = quality.get_quality() if quality is not None else context.get_quality()
+        prefix = context.get_prefix()
+
+        def commit(context: Asset, result: tuple[dict[str, list[int]], list[tuple[str, int, int, int, int, str]]]):
+            images, pages = result
+            textures = []  # type: list[tuple[str, list[int], int]]
+            for output, w, h, _, _, suffix in pages:
+                mipmaps = len(utils.calculate_mipmaps(w, h)) + 1 if mipmap else 1
+                textures.append((prefix + context.to_relative_output(output) + suffix, [w, h], mipmaps))
+            for img, viewport in images.items():
+                context.register_image(img)
+                # Page number is present in multi-page or trimmed atlas, followed by the trim information
+                texture, padded, mipmaps = textures[viewport[4] if len(viewport) > 4 else 0]
+                trim = viewport[5:9] if len(viewport) > 5 else None
+                size = (trim or viewport)[2:4] * 2
+                context.add_manifest_entry(img, texture, size, padded, viewport[:4], mipmaps, trim)
+            for (output, w, h, iw, ih, _), (texture, padded, mipmaps) in zip(pages, textures):
+                name = context.to_relative_output(output) + ".png"
+                context.add_real_size(name, w, h, w, h, prefix=prefix, quality=quality)
+                context.add_manifest_entry(prefix + name, texture, [iw, ih, iw, ih], padded, [0, 0, iw, ih], mipmaps)
+
+        return [Job(lambda: self.process(context, mipmap, quality), commit, context.get_output_path(self.value))]
+
+    def process(self, context: Asset, mipmap: bool, quality: str):
+        algo = self.get_option(AlgorithmOption)
         profile = context.get_profile()
         print(f"Packing {self.value}")
-        images, output, png = profile.run_packer(
-            context.get_input_path(self.value),
-            context.get_output_path(),
-            True,
-            "grid" if algo == None else algo.get_value(),
-        )
-        w, h = profile.run_compressor(png, output, mips.get_mipmap() if mips is not None else context.get_mipmap())
-        for img in images:
-            context.register_image(img)
-        context.add_real_size(context.to_relative_output(output) + ".png", w, h, w, h)
+        algorithm = "grid" if algo == None else algo.get_value()
+        output_dir = context.get_output_path()
+
+        def run():
+            return (output_dir, *profile.run_packer(context.get_input_path(self.value), output_dir, True, algorithm))
+
+        intermediates = get_intermediates()
+        if intermediates is None:
+            _, images, pages = run()
+        else:
+            packed_dir, images, pages = intermediates.get(("pack", self.value, algorithm), run)
+            if packed_dir != output_dir:
+                # Packed for another profile, only the atlas description is copied
+                source_json = get_atlas_json([page for page, _ in pages])
+                json_file = os.path.join(output_dir, os.path.relpath(source_json, packed_dir))
+                utils.rmkdir(os.path.dirname(json_file))
+                shutil.copyfile(source_json, json_file)
+                get_tracer().file_written(json_file)
+                pages = [(os.path.join(output_dir, os.path.relpath(page, packed_dir)), image) for page, image in pages]
+        mipmode = self.get_option(MipmapModeOption)
+        result = []  # type: list[tuple[str, int, int, int, int, str]]
+        for output, image in pages:
+            pipeline = profile.create_pipeline(image)
+            iw, ih = pipeline.get_size()
+            if mipmode is not None:
+                pipeline.set_mipmap_from_base(mipmode.is_from_base())
+            with get_tracer().span("compress", "stage", input=output):
+                w, h = profile.run_compressor(image, output, mipmap, pipeline, quality)
+            suffixes = profile.get_output_suffixes(w, h, mipmap)
+            for suffix in suffixes:
+                get_tracer().file_written(output + suffix)
+            result.append((output, w, h, iw, ih, suffixes[0]))
+        return (images, result)
+
+
+def get_atlas_json(pages: list[str]):
+    # Pages of multi-page atlas are named <output>_<page>, the atlas description is <output>.json
+    if len(pages) > 1:
+        return pages[0].rsplit("_", 1)[0] + ".json"
+    return pages[0] + ".json"
@@ -0,0 +1,78 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import concurrent.futures
+import hashlib
+import threading
+
+from typing import Any, Callable, Dict, Tuple
+
+
+class DuplicateIndex:
+    # Maps the pixels of an image, along with how it's processed, to the job that encodes it.
+    # Later images with same key are aliased to it instead of being encoded again.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.writers = {}  # type: Dict[str, Tuple[str, concurrent.futures.Future]]
+        # The first image in the plan order of each key, which the rest refer to.
+        self.firsts = {}  # type: Dict[str, str]
+        # Identical files have identical pixels, so they're only decoded once.
+        self.pixel_hashes = {}  # type: Dict[bytes, str]
+
+    def reset(self):
+        # Forget the outputs, which are planned again on rebuild. Pixel hashes depend only on the file content.
+        with self.lock:
+            self.writers = {}
+            self.firsts = {}
+
+    def get_pixel_hash(self, image: bytes, hasher: Callable[[bytes], str]):
+        digest = hashlib.sha256(image).digest()
+        with self.lock:
+            result = self.pixel_hashes.get(digest)
+        if result is None:
+            result = hasher(image)
+            with self.lock:
+                self.pixel_hashes[digest] = result
+        return result
+
+    def process(self, key: str, output: str, function: Callable[[], Any]) -> Tuple[Any, str]:
+        # Returns result of function and the output where it's written. Only the first job that
+        # reaches here with the key runs the function, the rest wait for it.
+        with self.lock:
+            existing = self.writers.get(key)
+            if existing is None:
+                future = concurrent.futures.Future()
+                self.writers[key] = (output, future)
+        if existing is not None:
+            return existing[1].result(), existing[0]
+        try:
+            result = function()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        future.set_result(result)
+        return result, output
+
+    def commit(self, key: str, output: str):
+        # Must be called in plan order, so the alias doesn't depend on which job processes first.
+        # Returns the output this one is alias of, or None if it's the first.
+        with self.lock:
+            first = self.firsts.setdefault(key, output)
+        return None if first == output else first
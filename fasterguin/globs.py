@@ -0,0 +1,65 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import re
+
+
+class GlobList:
+    # Comma-separated glob patterns, same as the packerguin include and exclude. "*" and "?" don't match "/" but "**"
+    # does. Patterns without "/" match the file name, the rest match the whole path relative to the folder.
+    def __init__(self, patterns: str):
+        self.patterns = [p.strip().replace("\\", "/") for p in patterns.split(",") if len(p.strip()) > 0]
+        names = [translate(p) for p in self.patterns if "/" not in p]
+        paths = [translate(p) for p in self.patterns if "/" in p]
+        self.name_match = re.compile("|".join(names)) if len(names) > 0 else None
+        self.path_match = re.compile("|".join(paths)) if len(paths) > 0 else None
+
+    def is_empty(self):
+        return len(self.patterns) == 0
+
+    def matches(self, path: str):
+        if self.name_match is not None and self.name_match.fullmatch(path.rsplit("/", 1)[-1]):
+            return True
+        return self.path_match is not None and self.path_match.fullmatch(path) is not None
+
+
+def translate(pattern: str):
+    result = []  # type: list[str]
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**", i):
+            result.append(".*")
+            i = i + 2
+            continue
+        c = pattern[i]
+        if c == "*":
+            result.append("[^/]*")
+        elif c == "?":
+            result.append("[^/]")
+        else:
+            result.append(re.escape(c))
+        i = i + 1
+    return "(?:" + "".join(result) + ")"
+
+
+def is_included(path: str, include: GlobList | None, exclude: GlobList | None):
+    if include is not None and not include.is_empty() and not include.matches(path):
+        return False
+    return exclude is None or not exclude.matches(path)
@@ -0,0 +1,68 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import contextlib
+import threading
+
+from typing import Any, Callable, Hashable
+
+
+class Intermediates:
+    # Results of the profile-independent work (reading, resizing, padding, packing) of a job, so the same job
+    # for the other profiles reuses them. Lives only while the job runs for all profiles.
+    def __init__(self):
+        self.values = {}  # type: dict[Hashable, Any]
+
+    def get(self, key: Hashable, function: Callable[[], Any]):
+        if key not in self.values:
+            self.values[key] = function()
+        return self.values[key]
+
+    def get_for(self, source: Any, key: Hashable, function: Callable[[], Any]):
+        # Same as get, for result derived from the source object. The source is kept, so its id() can't be reused.
+        entry = self.values.get((id(source), key))
+        if entry is None or entry[0] is not source:
+            entry = (source, function())
+            self.values[(id(source), key)] = entry
+        return entry[1]
+
+    def find_for(self, source: Any, key: Hashable):
+        entry = self.values.get((id(source), key))
+        if entry is None or entry[0] is not source:
+            return None
+        return entry[1]
+
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def share_intermediates():
+    previous = getattr(_local, "current", None)
+    _local.current = Intermediates()
+    try:
+        yield _local.current
+    finally:
+        _local.current = previous
+
+
+def get_intermediates() -> Intermediates | None:
+    # None when building single profile
+    return getattr(_local, "current", None)
@@ -0,0 +1,126 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import struct
+
+KTX_IDENTIFIER = b"\xabKTX 11\xbb\r\n\x1a\n"
+KTX_ENDIANNESS = 0x04030201
+KTX_HEADER = struct.Struct("<13I")
+
+
+class KTXTexture:
+    # KTX 1.1 2D texture. Only the fields needed to copy the images between files are kept, the
+    # key/value data is dropped.
+    def __init__(
+        self,
+        gl_type: int,
+        gl_type_size: int,
+        gl_format: int,
+        gl_internal_format: int,
+        gl_base_internal_format: int,
+        width: int,
+        height: int,
+    ):
+        self.gl_type = gl_type
+        self.gl_type_size = gl_type_size
+        self.gl_format = gl_format
+        self.gl_internal_format = gl_internal_format
+        self.gl_base_internal_format = gl_base_internal_format
+        self.width = width
+        self.height = height
+        self.levels = []  # type: list[bytes]
+
+    def get_size(self):
+        return self.width, self.height
+
+    def get_levels(self):
+        return self.levels
+
+    def add_level(self, data: bytes):
+        self.levels.append(data)
+
+    def is_compatible(self, other: "KTXTexture"):
+        return (
+            self.gl_type == other.gl_type
+            and self.gl_format == other.gl_format
+            and self.gl_internal_format == other.gl_internal_format
+        )
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            f.write(KTX_IDENTIFIER)
+            f.write(
+                KTX_HEADER.pack(
+                    KTX_ENDIANNESS,
+                    self.gl_type,
+                    self.gl_type_size,
+                    self.gl_format,
+                    self.gl_internal_format,
+                    self.gl_base_internal_format,
+                    self.width,
+                    self.height,
+                    0,
+                    0,
+                    1,
+                    len(self.levels),
+                    0,
+                )
+            )
+            for data in self.levels:
+                f.write(struct.pack("<I", len(data)))
+                f.write(data)
+                f.write(bytes(get_padding(len(data))))
+
+
+def read_ktx(path: str):
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:12] != KTX_IDENTIFIER or len(data) < 64:
+        raise Exception(f"'{path}' is not KTX file")
+    endian = "<" if struct.unpack_from("<I", data, 12)[0] == KTX_ENDIANNESS else ">"
+    header = struct.unpack_from(endian + "13I", data, 12)
+    _, gl_type, gl_type_size, gl_format, internal, base_internal, w, h, depth, arrays, faces, levels, kvsize = header
+    if depth > 1 or arrays > 0 or faces != 1:
+        raise Exception(f"'{path}' is not 2D texture")
+    texture = KTXTexture(gl_type, gl_type_size, gl_format, internal, base_internal, w, h)
+    offset = 64 + kvsize
+    for _ in range(max(levels, 1)):
+        size = struct.unpack_from(endian + "I", data, offset)[0]
+        offset = offset + 4
+        if offset + size > len(data):
+            raise Exception(f"'{path}' is truncated")
+        level = data[offset : offset + size]
+        if endian == ">" and gl_type_size > 1:
+            # Uncompressed data is in file endianness
+            level = swap_bytes(level, gl_type_size)
+        texture.add_level(level)
+        offset = offset + size + get_padding(size)
+    return texture
+
+
+def get_padding(size: int):
+    return 3 - ((size + 3) % 4)
+
+
+def swap_bytes(data: bytes, size: int):
+    result = bytearray(data)
+    for i in range(size):
+        result[i::size] = data[size - 1 - i :: size]
+    return bytes(result)
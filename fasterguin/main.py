@@ -22,6 +22,8 @@ import argparse
 import os
 import shlex
 import sys
+import time
+import traceback
 
 if __name__ == "__main__" and __package__ is None:
     # Copied from yt-dlp
@@ -31,12 +33,24 @@ if __name__ == "__main__" and __package__ is None:
 
 from . import utils
 from .asset import Asset
+from .cache import BuildCache
+from .commands.base import Command
 from .options.base import UnsupportedOption
+from .options.quality import QUALITY_PRESETS
+from .plan import BuildPlan
+from .profiles.base import Profile
+from .scanindex import ScanIndex
+from .sync import SyncIndex
+from .tools import get_tool_runner
+from .trace import ChromeTrace, Timings, get_tracer
+from .watch import create_watcher
 
-from . import COMMAND_LIST, OPTION_LIST, PROFILE_LIST
+from . import BACKEND_LIST, COMMAND_LIST, OPTION_LIST, PACKER_LIST, PROFILE_LIST
 
+from typing import Callable
 
-def process_command(cmddata: list[str], context: Asset):
+
+def parse_command(cmddata: list[str]) -> Command:
     # Parse command
     cmd_name = cmddata[0].lower()
     cmd_class = COMMAND_LIST.get(cmd_name)
@@ -54,7 +68,7 @@ def process_command(cmddata: list[str], context: Asset):
             cmd.add_option(opt)
         except UnsupportedOption as e:
             raise Exception(f"Command '{cmd_name}': {e}")
-    cmd.execute(context)
+    return cmd
 
 
 def main(arg):
@@ -62,15 +76,79 @@ def main(arg):
     parser.add_argument("input", help="Asset definition file.")
     parser.add_argument("output", help="Processed asset output directory.")
     parser.add_argument("-d", "--directory", help="Unprocessed asset input directory.")
-    parser.add_argument("-p", "--profile", help="Asset processing profile.", choices=PROFILE_LIST.keys(), default="pc")
+    parser.add_argument(
+        "-p",
+        "--profile",
+        help=f"Asset processing profile ({', '.join(PROFILE_LIST.keys())}). Comma-separated list builds each profile "
+        "to its own subdirectory of the output directory.",
+        type=parse_profiles,
+        default=["pc"],
+    )
+    parser.add_argument(
+        "--quality",
+        help="Default encoder quality, draft is fastest, final is for release, best is slowest.",
+        choices=QUALITY_PRESETS,
+        default="final",
+    )
     parser.add_argument("--astcenc", help="astcenc executable.")
     parser.add_argument("--etctool", help="EtcTool executable.")
     parser.add_argument("--etcpak", help="etcpak executable.")
     parser.add_argument("--love", help="LOVE executable.")
     parser.add_argument("--magick", help="ImageMagick executable.")
     parser.add_argument("--packer", help="packerguin path/.love file.")
+    parser.add_argument(
+        "--image-backend", help="Image processing backend.", choices=BACKEND_LIST.keys(), default="magick"
+    )
+    parser.add_argument("--packer-engine", help="Texture packer engine.", choices=PACKER_LIST.keys(), default="lua")
+    parser.add_argument(
+        "--packer-daemons",
+        help="Number of persistent LOVE packer processes (0 = new process for every pack).",
+        type=int,
+        default=1,
+    )
+    parser.add_argument("--cache-dir", help="Build cache directory (default is .fasterguin-cache in output).")
+    parser.add_argument("--cache-size", help="Maximum build cache size in MiB.", type=int, default=1024)
+    parser.add_argument("--no-cache", help="Disable build cache.", action="store_true")
+    parser.add_argument("-j", "--jobs", help="Number of parallel jobs (0 = CPU count).", type=int, default=1)
+    parser.add_argument("--watch", help="Rebuild the changed assets until interrupted.", action="store_true")
+    parser.add_argument("--watch-poll", help="Watch by polling instead of inotify.", action="store_true")
+    parser.add_argument(
+        "--tool-timeout",
+        help="Kill external programs running longer than SECONDS (0 = no limit). TOOL= limits it to that program "
+        "(magick, astcenc, etcpak, etctool, love). Can be specified more than once.",
+        type=parse_tool_timeout,
+        action="append",
+        default=[],
+        metavar="[TOOL=]SECONDS",
+    )
+    parser.add_argument(
+        "--prune",
+        help="Remove files copied by copyd before which are no longer in the source directory.",
+        action="store_true",
+    )
+    parser.add_argument("--trace", help="Write build trace in Chrome trace event format to this file.")
+    parser.add_argument(
+        "--timings",
+        help="Print the N (default 10) most time consuming tools, stages, and commands.",
+        type=int,
+        nargs="?",
+        const=10,
+        metavar="N",
+    )
     # Parse args
     args = parser.parse_args(arg[1:])
+    # Tracing must be set up before anything is run
+    chrome_trace = None
+    timings = None
+    if args.trace:
+        chrome_trace = ChromeTrace()
+        get_tracer().add_listener(chrome_trace)
+    if args.timings is not None:
+        timings = Timings()
+        get_tracer().add_listener(timings)
+    for tool, timeout in args.tool_timeout:
+        get_tool_runner().set_timeout(tool, timeout)
+    report = lambda: finish_trace(chrome_trace, args.trace, timings, args.timings or 0)
     opts = {
         "astcenc": args.astcenc,
         "etcpak": args.etcpak,
@@ -78,18 +156,88 @@ def main(arg):
         "magick": args.magick,
         "love": args.love,
         "packer": args.packer,
+        "image_backend": args.image_backend,
+        "packer_engine": args.packer_engine,
+        "packer_daemons": args.packer_daemons,
     }
-    profile = PROFILE_LIST[args.profile](opts)
-    asset = Asset(profile)
     input_abs = os.path.abspath(args.input)
     input_dir = os.path.dirname(input_abs) if args.directory == None else os.path.abspath(args.directory)
     output_abs = os.path.abspath(args.output)
-    asset.set_input_directory(input_dir)
-    asset.set_output_directory(output_abs)
     utils.rmkdir(output_abs)
+    cache = None
+    scan_index = ScanIndex()
+    sync_index = SyncIndex()
+    if not args.no_cache:
+        cache_dir = args.cache_dir or os.path.join(output_abs, ".fasterguin-cache")
+        cache = BuildCache(cache_dir, args.cache_size * 1048576)
+        scan_index = ScanIndex(os.path.join(cache_dir, "scan-index.json"))
+        sync_index = SyncIndex(os.path.join(cache_dir, "sync-index.json"))
+    assets = []  # type: list[Asset]
+    for name in args.profile:
+        profile = PROFILE_LIST[name](opts)
+        output_dir = output_abs if len(args.profile) == 1 else os.path.join(output_abs, name)
+        assets.append(
+            create_asset(profile, input_dir, output_dir, cache, scan_index, sync_index, args.quality, args.prune)
+        )
     # Start parsing
+    plan = load_plan(input_abs)
+    jobs = args.jobs or os.cpu_count() or 1
+    with get_tracer().span("build", "build", jobs=jobs):
+        plan.execute(assets, jobs)
+        finish_build(assets)
+    report()
+    if args.watch:
+        watch(input_abs, assets, plan, jobs, args.watch_poll, report)
+
+
+def parse_profiles(value: str):
+    result = []  # type: list[str]
+    for name in value.split(","):
+        name = name.strip().lower()
+        if name not in PROFILE_LIST:
+            raise argparse.ArgumentTypeError(f"invalid profile '{name}'")
+        if name not in result:
+            result.append(name)
+    return result
+
+
+def parse_tool_timeout(value: str):
+    tool, _, seconds = value.rpartition("=")
+    try:
+        timeout = float(seconds)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid timeout '{seconds}'")
+    if timeout < 0:
+        raise argparse.ArgumentTypeError("timeout must not be negative")
+    # 0 removes the limit
+    return (tool.lower() or None, timeout or None)
+
+
+def create_asset(
+    profile: Profile,
+    input_dir: str,
+    output_dir: str,
+    cache: BuildCache | None,
+    scan_index: ScanIndex,
+    sync_index: SyncIndex,
+    quality: str = "final",
+    prune: bool = False,
+):
+    asset = Asset(profile)
+    asset.set_quality(quality)
+    asset.set_prune(prune)
+    asset.set_input_directory(input_dir)
+    asset.set_output_directory(output_dir)
+    asset.set_cache(cache)
+    asset.set_scan_index(scan_index)
+    asset.set_sync_index(sync_index)
+    return asset
+
+
+def load_plan(input: str):
+    plan = BuildPlan()
     line_count = 0
-    with open(args.input, "r", encoding="UTF-8") as f:
+    with open(input, "r", encoding="UTF-8") as f:
         for line in f:
             line_count = line_count + 1
             line = line.strip()
@@ -97,15 +245,102 @@ def main(arg):
                 params = shlex.split(line, True)
                 if len(params) > 0:
                     try:
-                        process_command(params, asset)
+                        plan.add_command(line_count, parse_command(params))
                     except Exception as e:
                         print(f"Error while parsing at line {line_count}")
                         raise e
+    return plan
+
+
+def finish_build(assets: list[Asset]):
     # Write metadata
-    realsize = asset.get_output_path(asset.get_realsize_output())
-    with open(realsize, "w", encoding="UTF-8") as f:
-        print(f"Writing {realsize}")
-        asset.dump_real_size(f)
+    for asset in assets:
+        realsize = asset.get_output_path(asset.get_realsize_output())
+        with open(realsize, "wb") as f:
+            print(f"Writing {realsize}")
+            asset.dump_real_size(f)
+        get_tracer().file_written(realsize)
+        if asset.get_manifest_output() is not None:
+            manifest = asset.get_output_path(asset.get_manifest_output())
+            with open(manifest, "wb") as f:
+                print(f"Writing {manifest}")
+                asset.dump_manifest(f)
+            get_tracer().file_written(manifest)
+    # Cache and scan index are shared by all profiles
+    cache = assets[0].get_cache()
+    if cache is not None:
+        hits, misses = cache.get_stats()
+        print(f"Build cache: {hits} hit(s), {misses} miss(es)")
+        cache.evict()
+    assets[0].get_scan_index().save()
+    assets[0].get_sync_index().save()
+    runner = get_tool_runner()
+    for tool, stats in sorted(runner.get_stats().items()):
+        message = f"{tool}: {stats.runs} run(s) in {stats.wall:.2f}s"
+        if stats.failures > 0:
+            message = message + f", {stats.failures} failure(s) ({stats.timeouts} timed out), {stats.retries} retried"
+        print(message)
+    runner.reset_stats()
+
+
+def finish_trace(chrome_trace: ChromeTrace | None, trace_file: str, timings: Timings | None, count: int):
+    if chrome_trace is not None:
+        print(f"Writing {trace_file}")
+        chrome_trace.save(trace_file)
+    if timings is not None:
+        timings.print_summary(count)
+        timings.reset()
+
+
+def watch(input: str, assets: list[Asset], plan: BuildPlan, jobs: int, polling: bool, report: Callable[[], None]):
+    # Keep the plan and the build state, and only run the commands affected by the changed files.
+    input_dir = assets[0].get_input_path()
+    exclude = [asset.get_output_path() for asset in assets]
+    cache = assets[0].get_cache()
+    if cache is not None:
+        exclude.append(cache.get_path())
+    directories = [input_dir]
+    input_parent = os.path.dirname(input)
+    if input_parent != input_dir and not input_parent.startswith(input_dir + os.sep):
+        directories.append(input_parent)
+    watcher = create_watcher(directories, exclude, polling)
+    print("Watching for changes, press Ctrl+C to stop.")
+    try:
+        while True:
+            changed = watcher.wait()
+            start = time.perf_counter()
+            try:
+                with get_tracer().span("rebuild", "build", jobs=jobs):
+                    if input in changed:
+                        print("Definition file changed, rebuilding everything")
+                        plan = load_plan(input)
+                        assets = [
+                            create_asset(
+                                asset.get_profile(),
+                                asset.get_input_path(),
+                                asset.get_output_path(),
+                                asset.get_cache(),
+                                asset.get_scan_index(),
+                                asset.get_sync_index(),
+                                asset.get_quality(),
+                                asset.get_prune(),
+                            )
+                            for asset in assets
+                        ]
+                        plan.execute(assets, jobs)
+                    else:
+                        commands = plan.get_affected(assets[0], changed)
+                        plan.execute(assets, jobs, commands)
+                    finish_build(assets)
+                report()
+                print(f"Rebuilt in {time.perf_counter() - start:.2f}s")
+            except Exception:
+                traceback.print_exc()
+                print("Build failed, waiting for changes.")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
 
 
 if __name__ == "__main__":
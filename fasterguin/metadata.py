@@ -0,0 +1,110 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import json
+import struct
+
+from typing import Any, BinaryIO
+
+# Binary format: BINARY_MAGIC, then the root value. Each value starts with its type byte and all numbers are little
+# endian. Strings are UTF-8 prefixed with uint32 byte length, arrays and maps are prefixed with uint32 count, and map
+# keys are strings without the type byte.
+BINARY_MAGIC = b"FGM\x01"
+BINARY_INT = 1  # int32
+BINARY_STRING = 2
+BINARY_ARRAY = 3
+BINARY_MAP = 4
+BINARY_FLOAT = 5  # float64
+BINARY_TRUE = 6
+BINARY_FALSE = 7
+
+LUA_ESCAPES = {"\\": "\\\\", '"': '\\"', "\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+
+def dump(data: Any, f: BinaryIO, format: str = "json"):
+    f.write(dumps(data, format))
+
+
+def dumps(data: Any, format: str = "json") -> bytes:
+    if format == "json":
+        return json.dumps(data, indent="\t", ensure_ascii=False).encode("UTF-8")
+    elif format == "lua":
+        return dumps_lua(data).encode("UTF-8")
+    elif format == "binary":
+        result = bytearray(BINARY_MAGIC)
+        write_binary(result, data)
+        return bytes(result)
+    raise Exception(f"Unknown metadata format '{format}'")
+
+
+def dumps_lua(data: dict[str, Any]):
+    # Module returning the table, one entry per line
+    lines = ["return {"]
+    for key, value in data.items():
+        lines.append(f"\t[{to_lua(key)}] = {to_lua(value)},")
+    lines.append("}\n")
+    return "\n".join(lines)
+
+
+def to_lua(value: Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    elif isinstance(value, (int, float)):
+        return repr(value)
+    elif isinstance(value, str):
+        return '"' + "".join(LUA_ESCAPES.get(c, f"\\{ord(c):03d}" if ord(c) < 32 else c) for c in value) + '"'
+    elif isinstance(value, (list, tuple)):
+        return "{" + ", ".join(to_lua(v) for v in value) + "}"
+    elif isinstance(value, dict):
+        return "{" + ", ".join(f"[{to_lua(k)}] = {to_lua(v)}" for k, v in value.items()) + "}"
+    raise Exception(f"Can't write {type(value).__name__} to Lua")
+
+
+def write_binary(out: bytearray, value: Any):
+    if isinstance(value, bool):
+        out.append(BINARY_TRUE if value else BINARY_FALSE)
+    elif isinstance(value, int):
+        out.append(BINARY_INT)
+        out.extend(struct.pack("<i", value))
+    elif isinstance(value, float):
+        out.append(BINARY_FLOAT)
+        out.extend(struct.pack("<d", value))
+    elif isinstance(value, str):
+        out.append(BINARY_STRING)
+        write_binary_string(out, value)
+    elif isinstance(value, (list, tuple)):
+        out.append(BINARY_ARRAY)
+        out.extend(struct.pack("<I", len(value)))
+        for v in value:
+            write_binary(out, v)
+    elif isinstance(value, dict):
+        out.append(BINARY_MAP)
+        out.extend(struct.pack("<I", len(value)))
+        for k, v in value.items():
+            write_binary_string(out, k)
+            write_binary(out, v)
+    else:
+        raise Exception(f"Can't write {type(value).__name__} to binary metadata")
+
+
+def write_binary_string(out: bytearray, value: str):
+    data = value.encode("UTF-8")
+    out.extend(struct.pack("<I", len(data)))
+    out.extend(data)
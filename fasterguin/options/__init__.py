@@ -21,13 +21,25 @@
 from .algorithm import AlgorithmOption
 from .destination import DestinationOption
 from .dimension import DimensionOption
+from .exclude import ExcludeOption
+from .format import FormatOption
+from .include import IncludeOption
 from .mipmap import MipmapOption
+from .mipmode import MipmapModeOption
+from .quality import QualityOption
+from .recursive import RecursiveOption
 from .resize import ResizeOption
 
 OPTION_LIST = {
     "algorithm": AlgorithmOption,
     "destination": DestinationOption,
     "dimension": DimensionOption,
+    "exclude": ExcludeOption,
+    "format": FormatOption,
+    "include": IncludeOption,
     "mipmap": MipmapOption,
+    "mipmode": MipmapModeOption,
+    "quality": QualityOption,
+    "recursive": RecursiveOption,
     "resize": ResizeOption,
 }
@@ -0,0 +1,35 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+from ..backends.base import RawImage
+
+from typing import Dict, List, Tuple
+
+
+class Packer:
+    def __init__(self, opts: Dict[str, str]):
+        pass
+
+    def run(
+        self, input: str, output: str, po2: bool, algorithm: str = "grid"
+    ) -> Tuple[Dict[str, List[int]], List[Tuple[str, bytes | RawImage]]]:
+        # Implementation must override this. Returns the viewport of each image id in the atlas and the atlas pages.
+        # Each page is the filename without extension and the image, either as PNG or as raw pixels.
+        raise NotImplementedError("packer is not implemented")
@@ -0,0 +1,153 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import math
+
+from typing import List, Tuple
+
+# Rectangle placement for the native packer. Each function takes list of (w, h) and returns
+# the (x, y) of each rectangle in same order, and the resulting atlas dimensions.
+
+
+class TreeNode:
+    def __init__(self, x: int, y: int, w: int, h: int):
+        self.x = x
+        self.y = y
+        self.w = w
+        self.h = h
+        self.used = False
+        self.right = None  # type: TreeNode | None
+        self.down = None  # type: TreeNode | None
+
+    def find(self, w: int, h: int):
+        # Depth-first, right before down. Iterative to handle large amount of rectangles.
+        stack = [self]
+        while len(stack) > 0:
+            node = stack.pop()
+            if node.used:
+                stack.append(node.down)
+                stack.append(node.right)
+            elif w <= node.w and h <= node.h:
+                return node
+        return None
+
+    def split(self, w: int, h: int):
+        self.used = True
+        self.down = TreeNode(self.x, self.y + h, self.w, self.h - h)
+        self.right = TreeNode(self.x + w, self.y, self.w - w, h)
+        return self
+
+
+def sort_by_area(sizes: List[Tuple[int, int]]):
+    return sorted(range(len(sizes)), key=lambda i: (sizes[i][0] * sizes[i][1], max(sizes[i])), reverse=True)
+
+
+def tree_layout(sizes: List[Tuple[int, int]]):
+    # Binary tree packing which grows the root to keep the atlas square-ish.
+    positions = [(0, 0)] * len(sizes)  # type: List[Tuple[int, int]]
+    order = sort_by_area(sizes)
+    if len(order) == 0:
+        return positions, 0, 0
+    root = TreeNode(0, 0, *sizes[order[0]])
+    for i in order:
+        w, h = sizes[i]
+        node = root.find(w, h)
+        if node is None:
+            # Sorted by area, so the rectangle always fit at least one side of the root.
+            can_grow_down = w <= root.w
+            can_grow_right = h <= root.h
+            should_grow_right = can_grow_right and root.h >= root.w + w
+            should_grow_down = can_grow_down and root.w >= root.h + h
+            if should_grow_right or (can_grow_right and not should_grow_down):
+                new_root = TreeNode(0, 0, root.w + w, root.h)
+                new_root.used = True
+                new_root.down = root
+                new_root.right = TreeNode(root.w, 0, w, root.h)
+            else:
+                new_root = TreeNode(0, 0, root.w, root.h + h)
+                new_root.used = True
+                new_root.down = TreeNode(0, root.h, root.w, h)
+                new_root.right = root
+            root = new_root
+            node = root.find(w, h)
+            assert node is not None
+        node.split(w, h)
+        positions[i] = (node.x, node.y)
+    return positions, *get_dimensions(sizes, positions)
+
+
+def grid_layout(sizes: List[Tuple[int, int]]):
+    # Rows of rectangles sorted by height, wrapped at width that makes the atlas square-ish.
+    positions = [(0, 0)] * len(sizes)  # type: List[Tuple[int, int]]
+    if len(sizes) == 0:
+        return positions, 0, 0
+    order = sorted(range(len(sizes)), key=lambda i: (sizes[i][1], sizes[i][0]), reverse=True)
+    target = max(max(w for w, _ in sizes), math.ceil(math.sqrt(sum(w * h for w, h in sizes))))
+    x, y, row_height = 0, 0, 0
+    for i in order:
+        w, h = sizes[i]
+        if x + w > target:
+            x = 0
+            y = y + row_height
+            row_height = 0
+        positions[i] = (x, y)
+        x = x + w
+        row_height = max(row_height, h)
+    return positions, *get_dimensions(sizes, positions)
+
+
+def get_dimensions(sizes: List[Tuple[int, int]], positions: List[Tuple[int, int]]):
+    width = max(x + w for (w, _), (x, _) in zip(sizes, positions))
+    height = max(y + h for (_, h), (_, y) in zip(sizes, positions))
+    return width, height
+
+
+def paginate(sizes: List[Tuple[int, int]], algorithm: str, max_size: int):
+    # First-fit decreasing assignment of rectangles to pages, each page must fit in max_size.
+    # Returns list of pages, each is list of indices in ascending order.
+    layout = LAYOUT_LIST[algorithm]
+
+    def fits(page: List[int]):
+        _, w, h = layout([sizes[i] for i in page])
+        return max(w, h) <= max_size
+
+    everything = list(range(len(sizes)))
+    if fits(everything):
+        return [everything]
+    pages = []  # type: List[List[int]]
+    # Total area of each page. Rectangle that doesn't fit in the remaining area is not laid out at all.
+    areas = []  # type: List[int]
+    for i in sort_by_area(sizes):
+        area = sizes[i][0] * sizes[i][1]
+        for n, page in enumerate(pages):
+            if areas[n] + area > max_size * max_size:
+                continue
+            page.append(i)
+            if fits(page):
+                areas[n] = areas[n] + area
+                break
+            page.pop()
+        else:
+            pages.append([i])
+            areas.append(area)
+    return [sorted(page) for page in pages]
+
+
+LAYOUT_LIST = {"grid": grid_layout, "tree": tree_layout}
@@ -0,0 +1,196 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import atexit
+import json
+import os
+import queue
+import subprocess
+import threading
+import time
+
+from .. import scratch, tools, trace, utils
+from ..backends.base import RawImage
+from .base import Packer
+
+from typing import Dict, List, Tuple
+
+
+class PackerDaemon:
+    # Long-running packerguin in server mode. Jobs are sent as JSON lines to stdin and each
+    # job is answered with a JSON line in stdout. This saves LOVE startup for every pack.
+    def __init__(self, love: str, packer: str):
+        self.process = trace.Popen([love, packer, "--server"], 0, love, subprocess.PIPE, subprocess.PIPE, None)
+        # Read in separate thread, so waiting for the answer can time out. Empty line means end of stdout.
+        self.lines = queue.Queue()  # type: queue.Queue[bytes]
+        threading.Thread(target=self.read_lines, daemon=True).start()
+
+    def read_lines(self):
+        assert self.process.stdout is not None
+        for line in self.process.stdout:
+            self.lines.put(line)
+        self.lines.put(b"")
+
+    def request(self, job: Dict[str, str | bool], timeout: float | None = None) -> Dict[str, str | int]:
+        assert self.process.stdin is not None
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            self.process.stdin.write(json.dumps(job).encode("UTF-8") + b"\n")
+            self.process.stdin.flush()
+        except OSError:
+            raise tools.ToolError(f"Packer daemon exited with code {self.process.wait()}")
+        while True:
+            try:
+                line = self.lines.get(timeout=None if deadline is None else max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                raise tools.ToolError(f"love timed out after {timeout}s", timed_out=True)
+            if len(line) == 0:
+                raise tools.ToolError(f"Packer daemon exited with code {self.process.wait()}")
+            # Anything else written to stdout (e.g. by libraries) is not part of the protocol
+            if line.startswith(b"{"):
+                return json.loads(line)
+
+    def close(self, kill: bool = False):
+        if self.process.poll() is None:
+            assert self.process.stdin is not None
+            try:
+                if kill:
+                    self.process.kill()
+                else:
+                    self.process.stdin.close()
+                self.process.wait(10)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+
+
+class LuaPacker(Packer):
+    def __init__(self, opts: Dict[str, str]):
+        Packer.__init__(self, opts)
+        # Need LOVE
+        if os.name == "nt":
+            # In Windows, use lovec.exe
+            self.love = utils.get_program(opts, "love", "lovec")
+        else:
+            self.love = utils.get_program(opts, "love")
+        if self.love == None:
+            raise Exception("LOVE not found")
+        self.bb_rw_packer = opts["packer"]
+        if self.bb_rw_packer == None:
+            self.bb_rw_packer = os.getenv("BB_RW_PACKER")
+            if self.bb_rw_packer == None:
+                self.bb_rw_packer = utils.find_packerguin()
+                if self.bb_rw_packer == None:
+                    raise Exception("packerguin is not specified")
+        # Daemons are started lazily, up to this amount. 0 spawns new LOVE for every pack.
+        self.max_daemons = int(opts.get("packer_daemons") or 0)
+        self.daemons = []  # type: List[PackerDaemon]
+        self.idle_daemons = []  # type: List[PackerDaemon]
+        # Notified when a daemon becomes idle or is discarded, which frees its slot
+        self.daemon_condition = threading.Condition()
+        if self.max_daemons > 0:
+            atexit.register(self.close)
+
+    def run(self, input: str, output: str, po2: bool, algorithm: str = "grid"):
+        job = {"input": input, "output": output, "algorithm": algorithm, "po2": po2}
+        with scratch.get_scratch().directory() as tempdir:
+            # The atlas is handed over as raw pixels in scratch space, so it's neither PNG-encoded
+            # by packerguin nor decoded again by the image backend.
+            job["raw"] = os.path.join(tempdir, "atlas.rgba")
+            if self.max_daemons > 0:
+                result = self.run_daemon(job)
+            else:
+                result = self.run_process(job, os.path.join(tempdir, "result.json"))
+            pages = []  # type: List[Tuple[str, bytes | RawImage]]
+            for page in result["pages"]:
+                if "raw" in page:
+                    with open(page["raw"], "rb") as f:
+                        pages.append((page["output"], RawImage(page["width"], page["height"], f.read())))
+                else:
+                    # packerguin falls back to PNG if the atlas is not RGBA8
+                    with open(page["png"], "rb") as f:
+                        pages.append((page["output"], f.read()))
+                    os.remove(page["png"])
+        trace.get_tracer().file_written(result["json"])
+        with open(result["json"], "r", encoding="UTF-8") as f:
+            viewports = json.load(f)  # type: Dict[str, List[int]]
+        return (viewports, pages)
+
+    def acquire_daemon(self):
+        with self.daemon_condition:
+            while True:
+                if len(self.idle_daemons) > 0:
+                    return self.idle_daemons.pop()
+                if len(self.daemons) < self.max_daemons:
+                    daemon = PackerDaemon(self.love, self.bb_rw_packer)
+                    self.daemons.append(daemon)
+                    return daemon
+                self.daemon_condition.wait()
+
+    def release_daemon(self, daemon: PackerDaemon):
+        with self.daemon_condition:
+            self.idle_daemons.append(daemon)
+            self.daemon_condition.notify()
+
+    def discard_daemon(self, daemon: PackerDaemon, kill: bool = False):
+        daemon.close(kill)
+        with self.daemon_condition:
+            if daemon in self.daemons:
+                self.daemons.remove(daemon)
+            # Waiting thread can start new daemon now
+            self.daemon_condition.notify()
+
+    def run_daemon(self, job: Dict[str, str | bool]):
+        runner = tools.get_tool_runner()
+        daemon = self.acquire_daemon()
+        start = time.perf_counter()
+        runner.count("love", "runs")
+        try:
+            with trace.get_tracer().span("packer request", "daemon", input=job["input"]):
+                result = daemon.request(job, runner.get_timeout("love"))
+        except Exception as e:
+            timed_out = isinstance(e, tools.ToolError) and e.timed_out
+            runner.count("love", "failures")
+            if timed_out:
+                runner.count("love", "timeouts")
+            self.discard_daemon(daemon, timed_out)
+            raise
+        finally:
+            runner.add_wall("love", time.perf_counter() - start)
+        self.release_daemon(daemon)
+        if "error" in result:
+            raise Exception(f"Packer failed: {result['error']}")
+        return result
+
+    def run_process(self, job: Dict[str, str | bool], result_file: str):
+        cmd = [self.love, self.bb_rw_packer, job["input"], job["output"], "-a", job["algorithm"]]
+        cmd.extend(["--raw", job["raw"], "--result", result_file])
+        if job["po2"]:
+            cmd.append("-2")
+        tools.get_tool_runner().run("love", cmd)
+        with open(result_file, "r", encoding="UTF-8") as f:
+            return json.load(f)
+
+    def close(self):
+        with self.daemon_condition:
+            daemons = self.daemons
+            self.daemons = []
+            self.idle_daemons = []
+        for daemon in daemons:
+            daemon.close()
@@ -0,0 +1,308 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import hashlib
+import json
+import math
+import os
+import re
+
+from .. import utils
+from ..globs import GlobList, is_included
+from ..trace import get_tracer
+from ..backends.base import RawImage
+from .base import Packer
+from .layout import LAYOUT_LIST, paginate
+
+from typing import Dict, List, Tuple
+
+try:
+    import numpy
+    import PIL
+    import PIL.Image
+except ImportError:
+    numpy = None
+    PIL = None
+
+COMMAND_MATCH = re.compile(r"([A-Za-z]+)\s+(.+)")
+
+
+class PackImage:
+    def __init__(self, id: str, pixels: "numpy.ndarray"):
+        self.id = id
+        self.pixels = pixels
+        self.trim = None  # type: Tuple[int, int, int, int] | None
+        self.alias = None  # type: PackImage | None
+
+    def get_hash(self):
+        h = hashlib.sha256(self.pixels.tobytes())
+        h.update(repr(self.pixels.shape).encode("UTF-8"))
+        return h.digest()
+
+    def trim_transparent(self):
+        # Crop to the bounding box of non-transparent pixels, keeping the offset and the original dimensions.
+        w, h = self.get_dimensions()
+        self.trim = (0, 0, w, h)
+        alpha = self.pixels[:, :, 3]
+        rows = numpy.flatnonzero(alpha.any(1))
+        if len(rows) == 0:
+            # Fully transparent image is kept as-is
+            return
+        cols = numpy.flatnonzero(alpha.any(0))
+        x, y = int(cols[0]), int(rows[0])
+        self.pixels = self.pixels[y : int(rows[-1]) + 1, x : int(cols[-1]) + 1]
+        self.trim = (x, y, w, h)
+
+    def get_dimensions(self):
+        return self.pixels.shape[1], self.pixels.shape[0]
+
+
+class PackInput:
+    # Parser of Packer Guin input file, mirrors packerguin/main.lua
+    def __init__(self, path: str):
+        self.output = os.path.basename(path)
+        self.size = 1024
+        self.extrude = -1
+        self.current_extrude = 10
+        self.prefix = ""
+        self.trim = False
+        # Applied to the folder commands after them
+        self.recursive = False
+        self.include = GlobList("")
+        self.exclude = GlobList("")
+        self.start_files = False
+        self.images = []  # type: List[PackImage]
+        # All images in order, including the ones with same pixels as one in self.images
+        self.entries = []  # type: List[PackImage]
+        self.hashes = {}  # type: Dict[bytes, PackImage]
+        self.input_dir = os.path.dirname(os.path.abspath(path))
+        self.line_count = 1
+        with open(path, "r", encoding="UTF-8") as f:
+            for line in f:
+                line = line.rstrip("\r\n")
+                if len(line) > 0:
+                    self.parse_line(line)
+                self.line_count = self.line_count + 1
+
+    def parse_line(self, line: str):
+        match = re.search(COMMAND_MATCH, line)
+        if match is not None:
+            command, data = match.group(1).lower(), match.group(2)
+        elif line.strip().lower() in ("include", "exclude"):
+            # Empty list matches everything again
+            command, data = line.strip().lower(), ""
+        else:
+            raise Exception(f"Unexpected data at line {self.line_count}")
+        if command == "output":
+            self.ensure_no_files(command)
+            self.output = data
+        elif command == "size":
+            self.ensure_no_files(command)
+            self.size = self.ensure_number(command, data)
+            if self.extrude == -1:
+                self.current_extrude = math.ceil(math.log2(self.size))
+        elif command == "prefix":
+            self.ensure_no_files(command)
+            self.prefix = endslash(data)
+        elif command == "trim":
+            self.ensure_no_files(command)
+            data = data.lower()
+            if data in ("yes", "true", "1"):
+                self.trim = True
+            elif data in ("no", "false", "0"):
+                self.trim = False
+            else:
+                raise Exception(f"Invalid value for command '{command}' at line {self.line_count}")
+        elif command == "extrude":
+            self.ensure_no_files(command)
+            if data == "auto":
+                self.extrude = -1
+            else:
+                self.extrude = self.ensure_number(command, data)
+                if self.extrude < -1:
+                    raise Exception(f"'{command}' must be -1 or auto, 0 or greater, at line {self.line_count}")
+            if self.extrude == -1:
+                self.current_extrude = math.ceil(math.log2(self.size))
+        elif command == "recursive":
+            data = data.lower()
+            if data in ("yes", "true", "1"):
+                self.recursive = True
+            elif data in ("no", "false", "0"):
+                self.recursive = False
+            else:
+                raise Exception(f"Invalid value for command '{command}' at line {self.line_count}")
+        elif command == "include":
+            self.include = GlobList(data)
+        elif command == "exclude":
+            self.exclude = GlobList(data)
+        elif command == "file":
+            self.start_files = True
+            self.add_file(data, False)
+        elif command == "folder":
+            self.start_files = True
+            normal_data = endslash(data.replace("\\", "/"))
+            directories = [""]
+            for subdirectory in directories:
+                directory = self.get_input_path(normal_data + subdirectory)
+                for name in sorted(os.listdir(directory)):
+                    path = os.path.join(directory, name)
+                    if os.path.isfile(path):
+                        if is_included(subdirectory + name, self.include, self.exclude):
+                            self.add_file(normal_data + subdirectory + name, True)
+                    elif self.recursive and os.path.isdir(path):
+                        directories.append(subdirectory + name + "/")
+
+    def ensure_no_files(self, command: str):
+        if self.start_files:
+            raise Exception(f"Unexpected '{command}' files already processed at line {self.line_count}")
+
+    def ensure_number(self, command: str, data: str):
+        try:
+            return math.floor(float(data))
+        except ValueError:
+            raise Exception(f"Invalid number for command '{command}' at line {self.line_count}")
+
+    def get_input_path(self, path: str):
+        return utils.concat_path(self.input_dir, path)
+
+    def load_image(self, path: str, soft: bool):
+        try:
+            with PIL.Image.open(self.get_input_path(path)) as img:
+                return numpy.asarray(img.convert("RGBA"))
+        except (OSError, ValueError, PIL.UnidentifiedImageError) as e:
+            if soft:
+                return None
+            raise Exception(f"{e} at line {self.line_count}")
+
+    def add_file(self, path: str, soft: bool):
+        pixels = self.load_image(path, soft)
+        if pixels is None:
+            print(f"Image '{path}' is not a valid image file")
+            return
+        image = PackImage(self.prefix + path, pixels)
+        w, h = image.get_dimensions()
+        print(f"image {path} dimension {w}x{h}")
+        self.entries.append(image)
+        digest = image.get_hash()
+        if digest in self.hashes:
+            image.alias = self.hashes[digest]
+            image.pixels = None
+            print(f"image {path} is duplicate of {image.alias.id}")
+            return
+        if self.trim:
+            image.trim_transparent()
+            if image.get_dimensions() != (w, h):
+                w, h = image.get_dimensions()
+                print(f"image {path} trimmed to {w}x{h} at {image.trim[0]},{image.trim[1]}")
+        # The largest extrude must fit, as the extrude of the page is not known yet.
+        extrude = self.current_extrude if self.extrude == -1 else self.extrude
+        if max(w, h) + extrude * 2 > self.size:
+            raise Exception(f"Image '{path}' exceeded maximum atlas size {self.size} at line {self.line_count}")
+        self.images.append(image)
+        self.hashes[digest] = image
+
+
+class NativePacker(Packer):
+    # In-process implementation of packerguin, doesn't need LOVE.
+    def __init__(self, opts: Dict[str, str]):
+        Packer.__init__(self, opts)
+        if numpy is None or PIL is None:
+            raise Exception("Pillow and NumPy are required for python packer engine")
+
+    def run(self, input: str, output: str, po2: bool, algorithm: str = "grid"):
+        print(f"Input: {input}")
+        data = PackInput(input)
+        if len(data.images) == 0:
+            raise Exception("No images to pack")
+        sizes = [image.get_dimensions() for image in data.images]
+        # Images that don't fit in single atlas spill to more pages, named output_0, output_1, ...
+        fit_extrude = data.current_extrude if data.extrude == -1 else data.extrude
+        pages = paginate(extend_sizes(sizes, fit_extrude), algorithm, data.size)
+        if len(pages) > 1:
+            print(f"Atlas split into {len(pages)} pages")
+        filename = os.path.join(output, data.output)
+        utils.rmkdir(os.path.dirname(filename))
+        viewports = {}  # type: Dict[str, List[int]]
+        result = []  # type: List[Tuple[str, RawImage]]
+        for page_num, page in enumerate(pages):
+            images = [data.images[i] for i in page]
+            atlas, positions, extrude = self.bake(data, images, po2, algorithm)
+            for image, (x, y) in zip(images, positions):
+                viewport = [x + extrude, y + extrude, *image.get_dimensions()]
+                if len(pages) > 1 or image.trim is not None:
+                    viewport.append(page_num)
+                if image.trim is not None:
+                    # Offset of the trimmed image and the original dimensions
+                    viewport.extend(image.trim)
+                viewports[image.id] = viewport
+            page_filename = f"{filename}_{page_num}" if len(pages) > 1 else filename
+            result.append((page_filename, RawImage(atlas.shape[1], atlas.shape[0], atlas)))
+        json_file = filename + ".json"
+        print(f"Writing {json_file}")
+        atlas_viewports = {image.id: viewports[(image.alias or image).id] for image in data.entries}
+        with open(json_file, "w", encoding="UTF-8") as f:
+            json.dump(atlas_viewports, f, indent="\t", ensure_ascii=False)
+        get_tracer().file_written(json_file)
+        return (atlas_viewports, result)
+
+    def bake(self, data: PackInput, images: List[PackImage], po2: bool, algorithm: str):
+        layout = LAYOUT_LIST[algorithm]
+        sizes = [image.get_dimensions() for image in images]
+        if data.extrude == -1:
+            # Only the layout is needed to find the best extrude, pixels are placed once at the end.
+            extrude = data.current_extrude
+            print(f"Determining best extrude. Initial guess is {extrude}")
+            tried = set()  # type: set[int]
+            while True:
+                tried.add(extrude)
+                _, w, h = layout(extend_sizes(sizes, extrude))
+                new_extrude = math.ceil(math.log2(max(w, h)))
+                if new_extrude == extrude:
+                    break
+                print(f"Current extrude: {extrude}; new extrude: {new_extrude}")
+                if new_extrude in tried:
+                    # Oscillating, take the larger one
+                    extrude = max(extrude, new_extrude)
+                    break
+                extrude = new_extrude
+            print(f"Found best extrude: {extrude}")
+        else:
+            extrude = data.extrude
+        positions, w, h = layout(extend_sizes(sizes, extrude))
+        if max(w, h) > data.size:
+            raise Exception(f"Resulting atlas exceeded permitted POT size {data.size}, atlas is {w}x{h}")
+        if po2:
+            print("Ensuring PO2")
+            w, h = data.size, data.size
+        atlas = numpy.zeros((h, w, 4), numpy.uint8)
+        for image, (x, y) in zip(images, positions):
+            pixels = image.pixels
+            if extrude > 0:
+                pixels = numpy.pad(pixels, ((extrude, extrude), (extrude, extrude), (0, 0)), "edge")
+            atlas[y : y + pixels.shape[0], x : x + pixels.shape[1]] = pixels
+        return atlas, positions, extrude
+
+
+def endslash(path: str):
+    return path if path.endswith("/") else path + "/"
+
+
+def extend_sizes(sizes: List[Tuple[int, int]], extrude: int):
+    return [(w + extrude * 2, h + extrude * 2) for w, h in sizes]
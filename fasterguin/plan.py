@@ -0,0 +1,186 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import concurrent.futures
+import os
+
+from .asset import Asset
+from .commands import COMMAND_LIST
+from .commands.base import Command, Job
+from .intermediates import share_intermediates
+from .trace import get_tracer
+
+
+class BuildPlan:
+    def __init__(self):
+        self.commands = []  # type: list[tuple[int, Command]]
+
+    def add_command(self, line: int, command: Command):
+        self.commands.append((line, command))
+
+    def get_affected(self, context: Asset, changed: set[str]):
+        # Commands which have to be run again after the changed files, including the ones that only
+        # change the build state as the commands after them depend on it.
+        result = set()  # type: set[Command]
+        # Which image is aliased to which depends on all of them, so they're all checked again.
+        # Unchanged images are restored from the build cache.
+        dedupe = context.get_duplicate_index() is not None
+        for _, cmd in self.commands:
+            dependencies = cmd.get_dependencies(context)
+            if len(dependencies) == 0 or (dedupe and cmd.uses_duplicate_index()):
+                result.add(cmd)
+            else:
+                for path in changed:
+                    if any(path == dep or path.startswith(dep + os.sep) for dep in dependencies):
+                        result.add(cmd)
+                        break
+        return result
+
+    def execute(self, contexts: list[Asset], jobs: int = 1, commands: set[Command] | None = None):
+        # Each context is built with its own profile. If commands is specified, only those are run and the rest
+        # keep their previous result.
+        selected = [(line, cmd) for line, cmd in self.commands if commands is None or cmd in commands]
+        for context in contexts:
+            context.reset_state()
+            for _, cmd in selected:
+                context.forget_images(cmd)
+        try:
+            if jobs <= 1:
+                for line, cmd in selected:
+                    try:
+                        with get_tracer().span(
+                            get_trace_name(contexts[0], cmd), "command", group=get_command_name(cmd), line=line
+                        ):
+                            for group in plan_jobs(contexts, cmd):
+                                commit_jobs(cmd, group, run_jobs(group))
+                    except Exception as e:
+                        print(f"Error while processing line {line}")
+                        raise e
+            else:
+                with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+                    try:
+                        self.execute_parallel(contexts, executor, selected)
+                    except BaseException:
+                        executor.shutdown(False, cancel_futures=True)
+                        raise
+        finally:
+            for context in contexts:
+                context.set_owner(None)
+        if commands is not None:
+            for context in contexts:
+                context.sort_real_sizes([cmd for _, cmd in self.commands])
+
+    def execute_parallel(
+        self, contexts: list[Asset], executor: concurrent.futures.Executor, commands: list[tuple[int, Command]]
+    ):
+        pending = []  # type: list[tuple[int, Command, str, list[tuple[Asset, Job]], concurrent.futures.Future]]
+        last_by_key = {}  # type: dict[str, concurrent.futures.Future]
+        # Jobs writing inside each directory since the last job writing the whole directory
+        last_under = {}  # type: dict[str, list[concurrent.futures.Future]]
+        for line, cmd in commands:
+            # Commands are planned in order, so state changing commands (prefix, output, enable) are
+            # captured by the jobs of commands that come after them.
+            try:
+                groups = plan_jobs(contexts, cmd)
+            except Exception as e:
+                print(f"Error while processing line {line}")
+                raise e
+            for group in groups:
+                key = group[0][1].get_key()
+                name = get_trace_name(group[0][0], cmd, key)
+                # Jobs which write to same output must run in the order they're specified. Output inside directory
+                # written by other job (e.g. copyd) is same output too.
+                previous = []  # type: list[concurrent.futures.Future]
+                if key is not None:
+                    previous = [last_by_key[k] for k in (key, *get_parents(key)) if k in last_by_key]
+                    previous.extend(last_under.pop(key, []))
+                future = executor.submit(run_after, previous, group, name, cmd, line)
+                if key is not None:
+                    last_by_key[key] = future
+                    for parent in get_parents(key):
+                        last_under.setdefault(parent, []).append(future)
+                pending.append((line, cmd, name, group, future))
+        # Commit results in plan order so the metadata matches serial run.
+        for line, cmd, name, group, future in pending:
+            try:
+                results = future.result()
+                with get_tracer().span(name, "commit", group=get_command_name(cmd), line=line):
+                    commit_jobs(cmd, group, results)
+            except Exception as e:
+                print(f"Error while processing line {line}")
+                raise e
+
+
+def plan_jobs(contexts: list[Asset], cmd: Command):
+    # Same job of each context is grouped, so they run together and share the profile-independent work.
+    job_lists = []  # type: list[list[tuple[Asset, Job]]]
+    for context in contexts:
+        context.set_owner(cmd)
+        job_lists.append([(context, job) for job in cmd.plan(context)])
+    if len(job_lists) > 1 and all(len(job_list) == len(job_lists[0]) for job_list in job_lists):
+        return [list(group) for group in zip(*job_lists)]
+    return [[job] for job_list in job_lists for job in job_list]
+
+
+def run_jobs(group: list[tuple[Asset, Job]]):
+    if len(group) == 1:
+        return [group[0][1].run()]
+    with share_intermediates():
+        return [job.run() for _, job in group]
+
+
+def commit_jobs(cmd: Command, group: list[tuple[Asset, Job]], results: list):
+    for (context, job), result in zip(group, results):
+        if job.commit is not None:
+            context.set_owner(cmd)
+            job.commit(context, result)
+
+
+def run_after(
+    previous: list[concurrent.futures.Future], group: list[tuple[Asset, Job]], name: str, cmd: Command, line: int
+):
+    if len(previous) > 0:
+        # Earlier submitted job is never waiting on this one, so this can't deadlock.
+        concurrent.futures.wait(previous)
+    with get_tracer().span(name, "job", group=get_command_name(cmd), line=line):
+        return run_jobs(group)
+
+
+def get_parents(path: str):
+    # Directories containing the output path, up to the root
+    parent = os.path.dirname(path)
+    while parent != path:
+        yield parent
+        path, parent = parent, os.path.dirname(parent)
+
+
+def get_command_name(cmd: Command):
+    for name, cmd_class in COMMAND_LIST.items():
+        if type(cmd) is cmd_class:
+            return name
+    return type(cmd).__name__
+
+
+def get_trace_name(context: Asset, cmd: Command, key: str | None = None):
+    # Jobs of a folder command are named by the image they write
+    target = cmd.get_value() if key is None else key
+    if os.path.isabs(target):
+        target = os.path.relpath(target, context.get_output_path())
+    return f"{get_command_name(cmd)} {target}"
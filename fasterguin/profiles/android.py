@@ -18,16 +18,14 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
-import os
-import subprocess
-import sys
-import tempfile
-
-from .. import utils
-from .base import Profile
+from .. import ktx, scratch, tools, utils
+from ..backends.base import RawImage
+from .base import Profile, TransformPipeline
 
 
 POSSIBLE_ASTCENC = ["astcenc", "astcenc-avx2", "astcenc-sse4.1", "astcenc-sse2", "astcenc-neon", "astcenc-native"]
+# astcenc quality for each preset, 100 is same as -exhaustive
+ASTCENC_PRESETS = {"draft": "-fastest", "normal": "-medium", "final": "100", "best": "100"}
 
 
 class AndroidProfile(Profile):
@@ -41,31 +39,44 @@ class AndroidProfile(Profile):
         if self.astcenc == None:
             raise Exception("astcenc not found")
 
-    def run_compressor(self, image: bytes, destwoext: str, mipmap: bool = False):
-        image_po2, po2size = self.make_po2(image)
+    def run_compressor(
+        self,
+        image: bytes | RawImage,
+        destwoext: str,
+        mipmap: bool = False,
+        pipeline: TransformPipeline | None = None,
+        quality: str = "final",
+    ):
+        pipeline = self.create_pipeline(image, pipeline)
+        po2size = pipeline.make_po2()
         if mipmap:
-            mips = self.create_resized_mip(image_po2)
-            for i in range(len(mips)):
-                self.run_compressor_single(mips[i], f"{destwoext}.astc-mipmap{i+1}.ktx")
+            pipeline.enable_mipmap()
+            mips = self.run_pipeline(image, pipeline)
+            # All levels go to single KTX file, so the game can load it at once
+            texture = None  # type: ktx.KTXTexture | None
+            for mip in mips:
+                with scratch.get_scratch().file(b"", ".ktx") as filename:
+                    self.run_compressor_single(mip, filename, quality)
+                    level = ktx.read_ktx(filename)
+                if texture is None:
+                    texture = level
+                elif level.is_compatible(texture):
+                    texture.add_level(level.get_levels()[0])
+                else:
+                    raise Exception("astcenc wrote mipmap in different format")
+            assert texture is not None
+            texture.save(f"{destwoext}.astc.ktx")
         else:
-            self.run_compressor_single(image_po2, f"{destwoext}.astc.ktx")
+            self.run_compressor_single(self.run_pipeline(image, pipeline)[0], f"{destwoext}.astc.ktx", quality)
         return (po2size, po2size)
 
-    def run_compressor_single(self, png: bytes, dest: str):
-        filename = os.path.basename(tempfile.mktemp(".png"))
-        with open(filename, "wb") as f:
-            f.write(png)
-            f.close()
-        process = subprocess.Popen(
-            [self.astcenc, "-cl", filename, dest, "4x4", "100", "-silent"],
-            0,
-            self.astcenc,
-            subprocess.PIPE,
-            sys.stdout,
-            sys.stderr,
-        )
-        process.communicate(None)
-        process.wait()
-        os.remove(filename)
-        if process.returncode != 0:
-            raise Exception("astcenc failed")
+    def get_output_suffixes(self, width: int, height: int, mipmap: bool = False):
+        return [".astc.ktx"]
+
+    def get_cache_identity(self):
+        return Profile.get_cache_identity(self) + [utils.get_program_identity(self.astcenc)]
+
+    def run_compressor_single(self, png: bytes, dest: str, quality: str = "final"):
+        with scratch.get_scratch().file(png, ".png") as filename:
+            cmd = [self.astcenc, "-cl", filename, dest, "4x4", ASTCENC_PRESETS[quality], "-silent"]
+            tools.get_tool_runner().run("astcenc", cmd, capture=False)
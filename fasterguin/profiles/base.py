@@ -18,125 +18,134 @@
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
 
-import json
 import math
-import os
-import re
-import subprocess
 
 from .. import utils
+from ..backends import BACKEND_LIST
+from ..backends.base import ImageBackend, RawImage
+from ..intermediates import get_intermediates
+from ..packers import PACKER_LIST
+from ..packers.base import Packer
+from ..trace import get_tracer
 
 from typing import Dict, List, Tuple
 
-PACKER_OUTPUT_MATCH = re.compile(r"Writing (.+)")
-
 
 class Profile:
     def __init__(self, opts: Dict[str, str]):
-        # Need ImageMagick
-        self.magick = utils.get_program(opts, "magick")
-        if self.magick == None:
-            raise Exception("ImageMagick not found")
-        # Need LOVE
-        if os.name == "nt":
-            # In Windows, use lovec.exe
-            self.love = utils.get_program(opts, "love", "lovec")
-        else:
-            self.love = utils.get_program(opts, "love")
-        if self.love == None:
-            raise Exception("LOVE not found")
-        self.bb_rw_packer = opts["packer"]
-        if self.bb_rw_packer == None:
-            self.bb_rw_packer = os.getenv("BB_RW_PACKER")
-            if self.bb_rw_packer == None:
-                self.bb_rw_packer = utils.find_packerguin()
-                if self.bb_rw_packer == None:
-                    raise Exception("packerguin is not specified")
-
-    def run_resize(self, image: bytes, width: int, height: int):
-        process = subprocess.Popen(
-            [self.magick, "convert", "png:-", "-resize", "{}x{}!".format(width, height), "-depth", "8", "png:-"],
-            0,
-            self.magick,
-            subprocess.PIPE,
-            subprocess.PIPE,
-            subprocess.PIPE,
-        )
-        result, _ = process.communicate(image)
-        process.wait()
-        if process.returncode != 0:
-            utils.print_to_stderr(result)
-            raise Exception("Resize failed")
-        return result
+        self.backend = BACKEND_LIST[opts.get("image_backend") or "magick"](opts)  # type: ImageBackend
+        self.packer = PACKER_LIST[opts.get("packer_engine") or "lua"](opts)  # type: Packer
+
+    def run_pipeline(self, image: bytes | RawImage, pipeline: "TransformPipeline") -> List[bytes]:
+        if pipeline.is_empty() and not isinstance(image, RawImage):
+            return [image]
+        intermediates = get_intermediates()
+        if intermediates is None:
+            return self.run_backend(image, pipeline)
+        # Other profiles may need the same operations on the same image (e.g. padding to PO2)
+        operations, mipmap, from_base = pipeline.get_signature()
+        if not mipmap:
+            # Same as the base level of mipmapped image
+            for mipmap_from_base in (False, True):
+                key = ("pipeline", self.backend.get_identity(), operations, True, mipmap_from_base)
+                levels = intermediates.find_for(image, key)
+                if levels is not None:
+                    return levels[:1]
+        key = ("pipeline", self.backend.get_identity(), operations, mipmap, from_base)
+        return intermediates.get_for(image, key, lambda: self.run_backend(image, pipeline))
 
-    def make_po2(self, image: bytes) -> Tuple[bytes, int]:
-        width, height = utils.size_probe(image)
-        po2 = 2 ** math.ceil(math.log2(max(width, height)))  # type: int
-        process = subprocess.Popen(
-            [
-                self.magick,
-                "convert",
-                f"png:-",
-                "-background",
-                "transparent",
-                "-gravity",
-                "northwest",
-                "-extent",
-                "{}x{}".format(po2, po2),
-                "-depth",
-                "8",
-                "png:-",
-            ],
-            0,
-            self.magick,
-            subprocess.PIPE,
-            subprocess.PIPE,
-            subprocess.PIPE,
-        )
-        result, stderr = process.communicate(image)
-        process.wait()
-        if process.returncode != 0:
-            utils.print_to_stderr(stderr)
-            raise Exception("PO2 failed")
-        return result, po2
+    def run_backend(self, image: bytes | RawImage, pipeline: "TransformPipeline"):
+        with get_tracer().span("pipeline", "stage"):
+            return self.backend.run_pipeline(image, pipeline)
+
+    def run_pipeline_raw(self, image: bytes | RawImage, pipeline: "TransformPipeline"):
+        with get_tracer().span("pipeline", "stage"):
+            return self.backend.run_pipeline_raw(image, pipeline)
+
+    def get_pixel_hash(self, image: bytes):
+        return self.backend.get_pixel_hash(image)
 
     def run_packer(self, input: str, output: str, po2: bool, algorithm: str = "grid"):
-        cmd = [self.love, self.bb_rw_packer, input, output, "-a", algorithm]
-        if po2:
-            cmd.append("-2")
-        process = subprocess.Popen(cmd, 0, self.love, None, subprocess.PIPE, subprocess.PIPE)
-        # Run process
-        result, _ = process.communicate()
-        process.wait()
-        if process.returncode != 0:
-            utils.print_to_stderr(result)
-            raise Exception(f"Packer failed with exit code {process.returncode}")
-        result_str = str(result, "UTF-8")
-        out = re.findall(PACKER_OUTPUT_MATCH, result_str)
-        # output[1] is the PNG, output[2] is the JSON
-        out_png = out[0].strip()
-        out_json = out[1].strip()
-        with open(out_png, "rb") as f:
-            output_png = f.read()
-            f.close()
-            os.remove(out_png)
-        with open(out_json, "r", encoding="UTF-8") as f:
-            images = list(json.load(f).keys())  # type: List[str]
-        filename, _ = os.path.splitext(out_png)
-        return (images, filename, output_png)
-
-    def run_compressor(self, image: bytes, destwoext: str, mipmap: bool = False) -> Tuple[int, int]:
-        # Implementation must override this
+        with get_tracer().span("pack", "stage", input=input):
+            return self.packer.run(input, output, po2, algorithm)
+
+    def run_compressor(
+        self,
+        image: bytes | RawImage,
+        destwoext: str,
+        mipmap: bool = False,
+        pipeline: "TransformPipeline | None" = None,
+        quality: str = "final",
+    ) -> Tuple[int, int]:
+        # Implementation must override this. Pending operations in the pipeline (e.g. resize) must be
+        # applied to the image before compressing. Quality is one of QUALITY_PRESETS, the encoder
+        # speed/quality tradeoff.
         raise NotImplementedError("compression is not implemented")
 
-    def create_resized_mip(self, image: bytes):
-        sizes = utils.size_probe(image)
-        assert sizes is not None
-        (w, h) = sizes
-        mips = utils.calculate_mipmaps(w, h)
-        result = [image]
-        lastpng = image
-        for sw, sh in mips:
-            lastpng = self.run_resize(lastpng, sw, sh)
-            result.append(lastpng)
+    def get_output_suffixes(self, width: int, height: int, mipmap: bool = False) -> List[str]:
+        # List of files written by run_compressor, relative to destwoext
+        raise NotImplementedError("compression is not implemented")
+
+    def get_cache_identity(self) -> List[str]:
+        return [type(self).__name__, self.backend.get_identity()]
+
+    def create_pipeline(self, image: bytes | RawImage, pipeline: "TransformPipeline | None" = None):
+        if pipeline is None:
+            sizes = image.get_size() if isinstance(image, RawImage) else utils.size_probe(image)
+            assert sizes is not None
+            pipeline = TransformPipeline(*sizes)
+        return pipeline
+
+
+class TransformPipeline:
+    # Collects image operations so the image backend can do them in single pass,
+    # decoding the input and encoding each output exactly once.
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.operations = []  # type: List[Tuple[str, int, int]]
+        self.mipmap = False
+        self.mipmap_from_base = False
+
+    def get_size(self):
+        return self.width, self.height
+
+    def resize(self, width: int, height: int):
+        self.operations.append(("resize", width, height))
+        self.width, self.height = width, height
+
+    def extent(self, width: int, height: int):
+        self.operations.append(("extent", width, height))
+        self.width, self.height = width, height
+
+    def make_po2(self):
+        po2 = 2 ** math.ceil(math.log2(max(self.width, self.height)))  # type: int
+        self.extent(po2, po2)
+        return po2
+
+    def enable_mipmap(self):
+        self.mipmap = True
+
+    def set_mipmap_from_base(self, from_base: bool):
+        # Compute each mip level from the base level instead of from the previous level,
+        # so the resampling error doesn't compound.
+        self.mipmap_from_base = from_base
+
+    def is_mipmap_from_base(self):
+        return self.mipmap_from_base
+
+    def is_empty(self):
+        return len(self.operations) == 0 and not self.mipmap
+
+    def get_output_sizes(self):
+        result = [(self.width, self.height)]
+        if self.mipmap:
+            result.extend(utils.calculate_mipmaps(self.width, self.height))
         return result
+
+    def get_operations(self):
+        return self.operations
+
+    def get_signature(self):
+        # Pipelines with same signature produce same outputs from same image
+        return (tuple(self.operations), self.mipmap, self.mipmap_from_base)
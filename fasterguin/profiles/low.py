@@ -20,17 +20,23 @@
 
 import math
 import os
-import subprocess
-import sys
-import tempfile
 
-from .. import utils
-from .base import Profile
+from .. import scratch, tools, utils
+from ..backends.base import RawImage
+from .base import Profile, TransformPipeline
+
+
+# etc2comp effort (0-100) and etcpak flags for each quality. Release builds always used effort 0, which is already the
+# fastest, so only best is different.
+ETCTOOL_EFFORT = {"draft": "0", "normal": "0", "final": "0", "best": "100"}
+ETCPAK_FLAGS = {"draft": [], "normal": [], "final": [], "best": ["--disable-heuristics"]}
+ETCTOOL_RETRIES = 4
 
 
 class LowProfile(Profile):
     def __init__(self, opts: dict[str, str]):
         Profile.__init__(self, opts)
+        self.etctool = None
         # Search etcpak
         self.etcpak = utils.get_program(opts, "etcpak")
         if self.etcpak == None:
@@ -39,44 +45,53 @@ class LowProfile(Profile):
             if self.etctool == None:
                 raise Exception("etcpak nor EtcTool not found")
 
-    def run_compressor(self, image: bytes, destwoext: str, mipmap: bool = False):
-        # Create temp output directory
-        image_po2, po2size = self.make_po2(image)
+    def run_compressor(
+        self,
+        image: bytes | RawImage,
+        destwoext: str,
+        mipmap: bool = False,
+        pipeline: TransformPipeline | None = None,
+        quality: str = "final",
+    ):
+        pipeline = self.create_pipeline(image, pipeline)
+        po2size = pipeline.make_po2()
+        image_po2 = self.run_pipeline(image, pipeline)[0]
         # etc2 compressor has its own mipmap setting
         if self.etcpak:
-            self.run_compressor_etcpak(image_po2, f"{destwoext}.etc2.ktx", mipmap)
+            self.run_compressor_etcpak(image_po2, f"{destwoext}.etc2.ktx", mipmap, quality)
         else:
-            self.run_compressor_etctool(image_po2, f"{destwoext}.etc2.ktx", po2size if mipmap else None)
+            self.run_compressor_etctool(image_po2, f"{destwoext}.etc2.ktx", po2size if mipmap else None, quality)
         return (po2size, po2size)
 
-    def run_compressor_etcpak(self, png: bytes, dest: str, mipmaps: bool):
-        filenamepng = os.path.basename(tempfile.mktemp(".png"))
-        with open(filenamepng, "wb") as f:
-            f.write(png)
-            f.close()
-        cmd = [self.etcpak, "--rgba"]
-        if mipmaps:
-            cmd.append("-m")
-        cmd.extend([filenamepng, dest])
-        process = subprocess.Popen(cmd, 0, self.etctool, subprocess.PIPE, sys.stdout, sys.stderr)
-        process.communicate(None)
-        process.wait()
-        if process.returncode != 0:
-            print(f"etcpak failed with code {process.returncode}")
-        os.remove(filenamepng)
+    def get_output_suffixes(self, width: int, height: int, mipmap: bool = False):
+        return [".etc2.ktx"]
+
+    def get_cache_identity(self):
+        return Profile.get_cache_identity(self) + [
+            utils.get_program_identity(self.etcpak),
+            utils.get_program_identity(self.etctool),
+        ]
+
+    def run_compressor_etcpak(self, png: bytes, dest: str, mipmaps: bool, quality: str = "final"):
+        with scratch.get_scratch().file(png, ".png") as filenamepng:
+            cmd = [self.etcpak, "--rgba", *ETCPAK_FLAGS[quality]]
+            if mipmaps:
+                cmd.append("-m")
+            cmd.extend([filenamepng, dest])
+            tools.get_tool_runner().run("etcpak", cmd, capture=False)
+
+    def run_compressor_etctool(self, png: bytes, dest: str, po2size: int | None, quality: str = "final"):
+        with scratch.get_scratch().file(png, ".png") as filenamepng:
+            self.run_etctool(filenamepng, dest, po2size, quality)
 
-    def run_compressor_etctool(self, png: bytes, dest: str, po2size: int | None):
-        filenamepng = os.path.basename(tempfile.mktemp(".png"))
-        with open(filenamepng, "wb") as f:
-            f.write(png)
-            f.close()
+    def run_etctool(self, filenamepng: str, dest: str, po2size: int | None, quality: str = "final"):
         cmd = [
             self.etctool,
             filenamepng,
             "-format",
             "RGBA8",
             "-effort",
-            "0",
+            ETCTOOL_EFFORT[quality],
             "-j",
             str(os.cpu_count()),
         ]
@@ -84,17 +99,5 @@ class LowProfile(Profile):
             mcount = str(int(math.log2(po2size)) + 1)
             cmd.extend(["-m", mcount])
         cmd.extend(["-output", dest])
-        success = False
-        # etc2comp crashes sometimes, so try it 10 times
-        for i in range(1, 11):
-            process = subprocess.Popen(cmd, 0, self.etctool, subprocess.PIPE, sys.stdout, sys.stderr)
-            process.communicate(None)
-            process.wait()
-            if process.returncode == 0:
-                success = True
-                break
-            else:
-                print(f"etctool failed with code {process.returncode}, attempt {i} of 10")
-        if not success:
-            raise Exception("etctool failed")
-        os.remove(filenamepng)
+        # etc2comp crashes sometimes, so try it again
+        tools.get_tool_runner().run("etctool", cmd, retries=ETCTOOL_RETRIES, capture=False)
@@ -21,21 +21,36 @@
 import io
 
 from .. import utils
-from .base import Profile
+from ..backends.base import RawImage
+from .base import Profile, TransformPipeline
 
 
 class PCProfile(Profile):
-    def run_compressor(self, image: bytes, destwoext: str, mipmap: bool = False):
-        sizes = utils.size_probe(image)
-        assert sizes is not None
-        (w, h) = sizes
+    def run_compressor(
+        self,
+        image: bytes | RawImage,
+        destwoext: str,
+        mipmap: bool = False,
+        pipeline: TransformPipeline | None = None,
+        quality: str = "final",
+    ):
+        # PNG is lossless, quality doesn't matter
+        pipeline = self.create_pipeline(image, pipeline)
+        (w, h) = pipeline.get_size()
         if mipmap:
-            mips = self.create_resized_mip(image)
+            pipeline.enable_mipmap()
+            mips = self.run_pipeline(image, pipeline)
             for i in range(len(mips)):
                 with open(f"{destwoext}-mipmap{i + 1}.png", "wb+") as f:
                     f.write(mips[i])
         else:
-            # Just write PNG
+            # Just write PNG (re-encoded only when there are pending operations)
             with open(f"{destwoext}.png", "wb+") as f:
-                f.write(image)
+                f.write(self.run_pipeline(image, pipeline)[0])
         return w, h
+
+    def get_output_suffixes(self, width: int, height: int, mipmap: bool = False):
+        if mipmap:
+            return [f"-mipmap{i + 1}.png" for i in range(len(utils.calculate_mipmaps(width, height)) + 1)]
+        else:
+            return [".png"]
@@ -0,0 +1,109 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import io
+import json
+import os
+import struct
+
+from . import utils
+
+INDEX_VERSION = 1
+
+
+class ScanEntry:
+    def __init__(self, name: str, path: str, kind: str, width: int, height: int):
+        self.name = name
+        self.path = path
+        self.kind = kind
+        self.width = width
+        self.height = height
+
+    def is_valid_image(self):
+        return self.kind == "png"
+
+    def get_dimensions(self):
+        if self.width > 0 and self.height > 0:
+            return self.width, self.height
+        return None
+
+
+class ScanIndex:
+    # Remembers file header information of scanned directories, so unchanged files don't
+    # have to be opened again in the next build.
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self.entries = {}  # type: dict[str, list]
+        self.used = {}  # type: dict[str, list]
+        if path is not None:
+            try:
+                with open(path, "r", encoding="UTF-8") as f:
+                    data = json.load(f)
+                if data.get("version") == INDEX_VERSION:
+                    self.entries = data["entries"]
+            except (OSError, ValueError, KeyError):
+                pass
+
+    def scan(self, directory: str, recursive: bool = False):
+        # Name of each entry is relative to the directory, with "/" separator
+        result = []  # type: list[ScanEntry]
+        # Symlinked directories are followed, along with the (st_dev, st_ino) of the directories above them
+        directories = [("", frozenset())]  # type: list[tuple[str, frozenset[tuple[int, int]]]]
+        for subdirectory, parents in directories:
+            path = os.path.join(directory, subdirectory)
+            stat = os.stat(path)
+            identity = (stat.st_dev, stat.st_ino)
+            if identity in parents:
+                # Symlink to the directory itself or its parent
+                continue
+            parents = parents | {identity}
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_file():
+                        result.append(self.probe(entry, subdirectory + entry.name))
+                    elif recursive and entry.is_dir():
+                        directories.append((subdirectory + entry.name + "/", parents))
+        return result
+
+    def probe(self, entry: os.DirEntry, name: str):
+        stat = entry.stat()
+        cached = self.entries.get(entry.path)
+        if cached is None or cached[0] != stat.st_size or cached[1] != stat.st_mtime_ns:
+            kind, width, height = "", 0, 0
+            with open(entry.path, "rb") as f:
+                if f.read(8) == b"\x89PNG\r\n\x1a\n":
+                    kind = "png"
+                    f.seek(0, io.SEEK_SET)
+                    try:
+                        sizes = utils.size_probe(f)
+                    except struct.error:
+                        # Truncated file, let the image command report it
+                        sizes = None
+                    if sizes is not None:
+                        width, height = sizes
+            cached = [stat.st_size, stat.st_mtime_ns, kind, width, height]
+        self.used[entry.path] = cached
+        return ScanEntry(name, entry.path, cached[2], cached[3], cached[4])
+
+    def save(self):
+        if self.path is not None:
+            with open(self.path, "w", encoding="UTF-8") as f:
+                # Only keep files seen in this build, so the index doesn't grow forever
+                json.dump({"version": INDEX_VERSION, "entries": self.used}, f)
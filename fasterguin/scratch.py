@@ -0,0 +1,77 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import atexit
+import contextlib
+import os
+import shutil
+import tempfile
+import threading
+
+# RAM-backed locations, tried in order
+RAM_DIRECTORIES = ["/dev/shm", "/run/shm"]
+
+
+class ScratchSpace:
+    # Private per-run directory for intermediate files handed to external programs.
+    # Files are put in RAM-backed filesystem when available. Note that memfd can't be
+    # used as the encoders select their image loader by file extension.
+    def __init__(self, root: str | None = None):
+        if root is None:
+            for path in RAM_DIRECTORIES:
+                if os.path.isdir(path) and os.access(path, os.W_OK | os.X_OK):
+                    root = path
+                    break
+        self.path = tempfile.mkdtemp(prefix="fasterguin-", dir=root)
+        atexit.register(self.cleanup)
+
+    def get_path(self):
+        return self.path
+
+    @contextlib.contextmanager
+    def file(self, data: bytes, suffix: str = ""):
+        fd, path = tempfile.mkstemp(suffix, dir=self.path)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            yield path
+        finally:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def directory(self):
+        return tempfile.TemporaryDirectory(dir=self.path)
+
+    def cleanup(self):
+        shutil.rmtree(self.path, True)
+
+
+_scratch = None  # type: ScratchSpace | None
+_scratch_lock = threading.Lock()
+
+
+def get_scratch():
+    global _scratch
+    with _scratch_lock:
+        if _scratch is None:
+            _scratch = ScratchSpace()
+        return _scratch
@@ -0,0 +1,176 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import concurrent.futures
+import errno
+import json
+import os
+import shutil
+import threading
+
+from . import utils
+from .trace import get_tracer
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+INDEX_VERSION = 1
+# ioctl to share the data blocks of other file (reflink) on Linux, supported by Btrfs, XFS, and others
+FICLONE = 0x40049409
+COPY_CHUNK = 1 << 30
+SYNC_THREADS = 8
+# copy_file_range or FICLONE is not supported between these files
+UNSUPPORTED_ERRNO = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTTY)
+
+
+class SyncIndex:
+    # Remembers the files copied to each destination directory, so --prune only removes the files that were
+    # copied there before and not the other outputs written to the same directory.
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}  # type: dict[str, list[str]]
+        self.used = {}  # type: dict[str, list[str]]
+        if path is not None:
+            try:
+                with open(path, "r", encoding="UTF-8") as f:
+                    data = json.load(f)
+                if data.get("version") == INDEX_VERSION:
+                    self.entries = data["entries"]
+            except (OSError, ValueError, KeyError):
+                pass
+
+    def get_files(self, directory: str):
+        with self.lock:
+            return self.used.get(directory, self.entries.get(directory, []))
+
+    def set_files(self, directory: str, files: list[str]):
+        with self.lock:
+            self.used[directory] = files
+
+    def save(self):
+        if self.path is not None:
+            with self.lock, open(self.path, "w", encoding="UTF-8") as f:
+                json.dump({"version": INDEX_VERSION, "entries": self.used}, f)
+
+
+def sync_file(src: str, dst: str):
+    # Copy unless the destination has same size and modification time, which are copied along. Returns whether
+    # the file is copied.
+    stat = os.stat(src)
+    try:
+        dst_stat = os.stat(dst)
+        if dst_stat.st_size == stat.st_size and dst_stat.st_mtime_ns == stat.st_mtime_ns:
+            return False
+    except FileNotFoundError:
+        pass
+    copy_file(src, dst)
+    shutil.copystat(src, dst)
+    get_tracer().file_written(dst)
+    return True
+
+
+def sync_directory(src: str, dst: str, index: SyncIndex, prune: bool = False):
+    # Returns the number of copied, total, and removed files
+    files = []  # type: list[str]
+    directories = []  # type: list[str]
+    # Symlinked directories are followed, along with the (st_dev, st_ino) of the directories above them
+    pending = [("", frozenset())]  # type: list[tuple[str, frozenset[tuple[int, int]]]]
+    for directory, parents in pending:
+        stat = os.stat(os.path.join(src, directory))
+        identity = (stat.st_dev, stat.st_ino)
+        if identity in parents:
+            # Symlink to the directory itself or its parent
+            continue
+        parents = parents | {identity}
+        directories.append(directory)
+        with os.scandir(os.path.join(src, directory)) as it:
+            for entry in it:
+                path = os.path.join(directory, entry.name)
+                if entry.is_dir():
+                    pending.append((path, parents))
+                elif entry.is_file():
+                    files.append(path)
+    for directory in directories:
+        utils.rmkdir(os.path.join(dst, directory))
+    copy = lambda path: sync_file(os.path.join(src, path), os.path.join(dst, path))
+    if len(files) > 1:
+        with concurrent.futures.ThreadPoolExecutor(min(SYNC_THREADS, len(files))) as executor:
+            copied = sum(executor.map(copy, files))
+    else:
+        copied = sum(map(copy, files))
+    removed = 0
+    if prune:
+        keep = set(directories)
+        for path in set(index.get_files(dst)).difference(files):
+            try:
+                os.remove(os.path.join(dst, path))
+                removed = removed + 1
+            except FileNotFoundError:
+                pass
+            remove_empty_directories(dst, os.path.dirname(path), keep)
+    index.set_files(dst, files)
+    return copied, len(files), removed
+
+
+def remove_empty_directories(root: str, directory: str, keep: set[str]):
+    # Removes the directory and its parents if they're empty and not in the source
+    while len(directory) > 0 and directory not in keep:
+        try:
+            os.rmdir(os.path.join(root, directory))
+        except OSError:
+            # Not empty
+            return
+        directory = os.path.dirname(directory)
+
+
+def copy_file(src: str, dst: str):
+    # Let the filesystem share or copy the data without passing it through Python when possible
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        if clone_file(fsrc.fileno(), fdst.fileno()) or copy_file_range(fsrc.fileno(), fdst.fileno()):
+            return
+    shutil.copyfile(src, dst)
+
+
+def clone_file(src: int, dst: int):
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(dst, FICLONE, src)
+        return True
+    except OSError as e:
+        if e.errno in UNSUPPORTED_ERRNO:
+            return False
+        raise
+
+
+def copy_file_range(src: int, dst: int):
+    if not hasattr(os, "copy_file_range"):
+        return False
+    try:
+        while os.copy_file_range(src, dst, COPY_CHUNK) > 0:
+            pass
+        return True
+    except OSError as e:
+        if e.errno in UNSUPPORTED_ERRNO:
+            return False
+        raise
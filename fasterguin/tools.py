@@ -0,0 +1,157 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import subprocess
+import sys
+import threading
+import time
+
+from . import trace, utils
+
+# Delay before the first retry, doubled for each retry after it
+RETRY_DELAY = 0.5
+# Time to collect the output of killed program
+KILL_TIMEOUT = 1.0
+# Limits used unless --tool-timeout is given. etc2comp can hang instead of crashing.
+DEFAULT_TIMEOUTS = {"etctool": 1800.0}
+
+
+class ToolError(Exception):
+    def __init__(self, message: str, stderr: bytes = b"", timed_out: bool = False):
+        Exception.__init__(self, message)
+        self.stderr = stderr
+        self.timed_out = timed_out
+
+
+class ToolStats:
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.wall = 0.0
+
+
+class ToolRunner:
+    # Runs the external programs (encoders, ImageMagick, LOVE), so all of them are bounded by the same
+    # timeout and retry rules and report failures the same way.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.default_timeout = None  # type: float | None
+        self.default_timeout_set = False
+        self.timeouts = {}  # type: dict[str, float | None]
+        self.stats = {}  # type: dict[str, ToolStats]
+
+    def set_timeout(self, tool: str | None, timeout: float | None):
+        # None tool sets the timeout of every tool without its own timeout
+        if tool is None:
+            self.default_timeout = timeout
+            self.default_timeout_set = True
+        else:
+            self.timeouts[tool] = timeout
+
+    def get_timeout(self, tool: str):
+        if tool in self.timeouts:
+            return self.timeouts[tool]
+        if self.default_timeout_set:
+            return self.default_timeout
+        return DEFAULT_TIMEOUTS.get(tool)
+
+    def run(
+        self, tool: str, args: list[str], input: bytes | None = None, retries: int = 0, capture: bool = True
+    ) -> bytes:
+        # Returns the standard output if captured, otherwise it goes to our standard output. Standard error is
+        # shown only if the program fails. Program that timed out is likely to hang again, so it's not retried.
+        for attempt in range(retries + 1):
+            if attempt > 0:
+                self.count(tool, "retries")
+                time.sleep(RETRY_DELAY * 2 ** (attempt - 1))
+            try:
+                return self.run_once(tool, args, input, capture)
+            except ToolError as e:
+                utils.print_to_stderr(e.stderr)
+                if attempt == retries or e.timed_out:
+                    raise
+                print(f"{e}, attempt {attempt + 1} of {retries + 1}")
+        raise ToolError(f"{tool} was not run")
+
+    def run_once(self, tool: str, args: list[str], input: bytes | None, capture: bool):
+        timeout = self.get_timeout(tool)
+        start = time.perf_counter()
+        self.count(tool, "runs")
+        process = trace.Popen(
+            args,
+            0,
+            args[0],
+            subprocess.DEVNULL if input is None else subprocess.PIPE,
+            subprocess.PIPE if capture else sys.stdout,
+            subprocess.PIPE,
+        )
+        timed_out = False
+        try:
+            stdout, stderr = process.communicate(input, timeout)
+        except subprocess.TimeoutExpired:
+            stdout, stderr = None, self.kill(process)
+            timed_out = True
+        finally:
+            self.add_wall(tool, time.perf_counter() - start)
+        if timed_out:
+            self.count(tool, "timeouts")
+            self.count(tool, "failures")
+            raise ToolError(f"{tool} timed out after {timeout}s", stderr, True)
+        if process.returncode != 0:
+            self.count(tool, "failures")
+            raise ToolError(f"{tool} failed with code {process.returncode}", stderr or b"")
+        return stdout or b""
+
+    def kill(self, process: subprocess.Popen):
+        process.kill()
+        try:
+            _, stderr = process.communicate(None, KILL_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            # Its children still hold the pipes open
+            stderr = b""
+        process.wait()
+        return stderr or b""
+
+    def count(self, tool: str, counter: str):
+        with self.lock:
+            stats = self.stats.setdefault(tool, ToolStats())
+            setattr(stats, counter, getattr(stats, counter) + 1)
+
+    def add_wall(self, tool: str, wall: float):
+        with self.lock:
+            stats = self.stats.setdefault(tool, ToolStats())
+            stats.wall = stats.wall + wall
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats)
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {}
+
+
+_runner = ToolRunner()
+
+
+def get_tool_runner():
+    return _runner
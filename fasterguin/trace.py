@@ -0,0 +1,216 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import contextlib
+import json
+import os
+import subprocess
+import threading
+import time
+
+from typing import Any, Callable
+
+
+class TraceEvent:
+    def __init__(self, name: str, category: str, start: float, duration: float, args: dict[str, Any]):
+        self.name = name
+        self.category = category
+        # In seconds, relative to the tracer creation
+        self.start = start
+        self.duration = duration
+        self.thread = threading.get_ident()
+        self.args = args
+
+    def get_group(self) -> str:
+        return self.args.get("group", self.name)
+
+
+class Tracer:
+    # Instrumentation hooks. Listeners receive TraceEvent for each command, job, tool invocation
+    # and written file. Nothing is measured when there are no listeners.
+    def __init__(self):
+        self.epoch = time.perf_counter()
+        self.listeners = []  # type: list[Callable[[TraceEvent], None]]
+        self.lock = threading.Lock()
+
+    def add_listener(self, listener: Callable[[TraceEvent], None]):
+        self.listeners.append(listener)
+
+    def is_enabled(self):
+        return len(self.listeners) > 0
+
+    def get_time(self):
+        return time.perf_counter() - self.epoch
+
+    def emit(self, event: TraceEvent):
+        with self.lock:
+            for listener in self.listeners:
+                listener(event)
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str, **args: Any):
+        if not self.is_enabled():
+            yield args
+            return
+        start = self.get_time()
+        try:
+            # Caller can add more information to args
+            yield args
+        finally:
+            self.emit(TraceEvent(name, category, start, self.get_time() - start, args))
+
+    def file_written(self, path: str):
+        if self.is_enabled():
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = -1
+            self.emit(TraceEvent(os.path.basename(path), "write", self.get_time(), 0, {"path": path, "bytes": size}))
+
+
+class Popen(subprocess.Popen):
+    # subprocess.Popen which reports the invocation to the tracer once the process is waited for.
+    def __init__(self, args: list[str], *popenargs, **kwargs):
+        self.trace_start = _tracer.get_time()
+        self.trace_rusage = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.traced = False
+        self.communicating = False
+        subprocess.Popen.__init__(self, args, *popenargs, **kwargs)
+
+    def _try_wait(self, wait_flags):
+        # Same as subprocess.Popen._try_wait but also gets the resource usage of the child.
+        if not hasattr(os, "wait4"):
+            return subprocess.Popen._try_wait(self, wait_flags)
+        try:
+            pid, sts, self.trace_rusage = os.wait4(self.pid, wait_flags)
+        except ChildProcessError:
+            pid, sts = self.pid, 0
+        return pid, sts
+
+    def communicate(self, input: bytes | None = None, timeout: float | None = None):
+        # communicate() waits for the process too, so report after the output is counted
+        self.communicating = True
+        try:
+            stdout, stderr = subprocess.Popen.communicate(self, input, timeout)
+        finally:
+            self.communicating = False
+        self.bytes_in = self.bytes_in + len(input or b"")
+        self.bytes_out = self.bytes_out + len(stdout or b"")
+        self.report()
+        return stdout, stderr
+
+    def wait(self, timeout: float | None = None):
+        result = subprocess.Popen.wait(self, timeout)
+        self.report()
+        return result
+
+    def report(self):
+        if self.traced or self.communicating or self.returncode is None or not _tracer.is_enabled():
+            return
+        self.traced = True
+        argv = [str(arg) for arg in self.args]
+        args = {
+            "group": os.path.basename(argv[0]),
+            "argv": argv,
+            "exit_code": self.returncode,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+        if self.trace_rusage is not None:
+            args["cpu"] = self.trace_rusage.ru_utime + self.trace_rusage.ru_stime
+        start = self.trace_start
+        _tracer.emit(TraceEvent(os.path.basename(argv[0]), "tool", start, _tracer.get_time() - start, args))
+
+
+class ChromeTrace:
+    # Collects events to be written in Chrome trace event format (chrome://tracing, Perfetto).
+    def __init__(self):
+        self.events = []  # type: list[TraceEvent]
+
+    def __call__(self, event: TraceEvent):
+        self.events.append(event)
+
+    def save(self, path: str):
+        threads = {}  # type: dict[int, int]
+        result = []
+        for event in self.events:
+            tid = threads.setdefault(event.thread, len(threads) + 1)
+            data = {
+                "name": event.name,
+                "cat": event.category,
+                "ph": "X",
+                "ts": event.start * 1000000,
+                "dur": event.duration * 1000000,
+                "pid": 1,
+                "tid": tid,
+                "args": event.args,
+            }
+            if event.category == "write":
+                data["ph"] = "i"
+                data["s"] = "t"
+                del data["dur"]
+            result.append(data)
+        for thread, tid in threads.items():
+            name = "main" if thread == threading.main_thread().ident else f"worker {tid}"
+            result.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": name}})
+        with open(path, "w", encoding="UTF-8") as f:
+            json.dump({"traceEvents": result, "displayTimeUnit": "ms"}, f)
+
+
+class Timings:
+    # Summary of where the build time goes.
+    def __init__(self):
+        self.groups = {}  # type: dict[tuple[str, str], list[float]]
+        self.commands = []  # type: list[tuple[float, str]]
+
+    def __call__(self, event: TraceEvent):
+        if event.category in ("build", "write"):
+            return
+        stats = self.groups.setdefault((event.category, event.get_group()), [0, 0.0, 0.0])
+        stats[0] = stats[0] + 1
+        stats[1] = stats[1] + event.duration
+        stats[2] = stats[2] + event.args.get("cpu", 0.0)
+        if event.category in ("command", "job"):
+            self.commands.append((event.duration, event.name))
+
+    def reset(self):
+        self.groups = {}
+        self.commands = []
+
+    def print_summary(self, count: int):
+        print(f"Timings (top {count}):")
+        print(f"{'wall':>10} {'cpu':>10} {'count':>7}  name")
+        groups = sorted(self.groups.items(), key=lambda item: item[1][1], reverse=True)
+        for (category, name), (calls, wall, cpu) in groups[:count]:
+            cpu_str = f"{cpu:.2f}s" if category == "tool" else "-"
+            print(f"{wall:>9.2f}s {cpu_str:>10} {calls:>7}  {category} {name}")
+        if len(self.commands) > 0:
+            print(f"Slowest commands (top {count}):")
+            for duration, name in sorted(self.commands, reverse=True)[:count]:
+                print(f"{duration:>9.2f}s  {name}")
+
+
+_tracer = Tracer()
+
+
+def get_tracer():
+    return _tracer
@@ -41,10 +41,23 @@ def get_program(opts: dict[str, str], key: str, name: str | None = None):
     return result
 
 
+def get_program_identity(path: str | None):
+    # Used to invalidate cached results when the program is updated
+    if path is None:
+        return ""
+    # Bare program names are searched in PATH when run
+    resolved = shutil.which(path) or path
+    try:
+        stat = os.stat(resolved)
+    except OSError:
+        return path
+    return f"{resolved}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
 def print_to_stderr(text: bytes):
-    t = str(text, " UTF-8").strip()
+    t = str(text, "UTF-8", "replace").strip()
     if t:
-        print(t, file=sys.stdout)
+        print(t, file=sys.stderr)
 
 
 def size_probe(f: io.BytesIO | bytes):
@@ -73,15 +86,6 @@ def size_probe(f: io.BytesIO | bytes):
     return None
 
 
-def is_valid_image(path: str):
-    valid = False
-    with open(path, "rb") as f:
-        header = f.read(8)
-        valid = header == b"\x89PNG\r\n\x1A\n"
-        f.close()
-    return valid
-
-
 def rmkdir(path: str):
     try:
         os.makedirs(path)
@@ -94,6 +98,7 @@ PACKERGUIN_STRUCTURE = [
     "argparse.lua",
     "conf.lua",
     "JSON.lua",
+    "layout.lua",
     "main.lua",
     "mounter.lua",
     "RTA/baseAtlas.lua",
@@ -0,0 +1,166 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+# inotify event masks, from sys/inotify.h
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+IN_WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+INOTIFY_EVENT = struct.Struct("iIII")
+
+# Changes are collected until nothing changes for this long (in seconds), so saving a file
+# (which can be several writes) or copying many files triggers single rebuild.
+SETTLE_TIME = 0.2
+POLL_INTERVAL = 0.5
+
+
+class Watcher:
+    def __init__(self, directories: list[str], exclude: list[str]):
+        self.directories = [os.path.abspath(d) for d in directories]
+        self.exclude = [os.path.abspath(d) for d in exclude]
+
+    def is_excluded(self, path: str):
+        return any(path == d or path.startswith(d + os.sep) for d in self.exclude)
+
+    def wait(self) -> set[str]:
+        # Implementation must override this. Blocks until something changes, then returns the
+        # absolute path of changed files and directories.
+        raise NotImplementedError("watcher is not implemented")
+
+    def close(self):
+        pass
+
+
+class PollingWatcher(Watcher):
+    def __init__(self, directories: list[str], exclude: list[str], interval: float = POLL_INTERVAL):
+        Watcher.__init__(self, directories, exclude)
+        self.interval = interval
+        self.state = self.snapshot()
+
+    def snapshot(self):
+        result = {}  # type: dict[str, tuple[int, int]]
+        for directory in self.directories:
+            for root, dirs, files in os.walk(directory):
+                dirs[:] = [d for d in dirs if not self.is_excluded(os.path.join(root, d))]
+                for name in files:
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                        result[path] = (stat.st_mtime_ns, stat.st_size)
+                    except OSError:
+                        pass
+        return result
+
+    def wait(self):
+        changed = set()  # type: set[str]
+        while True:
+            time.sleep(SETTLE_TIME if len(changed) > 0 else self.interval)
+            state = self.snapshot()
+            diff = {path for path in self.state.keys() | state.keys() if self.state.get(path) != state.get(path)}
+            self.state = state
+            if len(diff) > 0:
+                changed.update(diff)
+            elif len(changed) > 0:
+                return changed
+
+
+class InotifyWatcher(Watcher):
+    def __init__(self, directories: list[str], exclude: list[str]):
+        Watcher.__init__(self, directories, exclude)
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}  # type: dict[int, str]
+        try:
+            for directory in self.directories:
+                self.add_tree(directory)
+        except OSError:
+            self.close()
+            raise
+
+    def add_tree(self, path: str):
+        for root, dirs, _ in os.walk(path):
+            dirs[:] = [d for d in dirs if not self.is_excluded(os.path.join(root, d))]
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(root), IN_WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"Cannot watch {root}")
+            self.watches[wd] = root
+
+    def read_events(self):
+        result = set()  # type: set[str]
+        data = os.read(self.fd, 65536)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            name = data[offset + INOTIFY_EVENT.size : offset + INOTIFY_EVENT.size + length].rstrip(b"\0")
+            offset = offset + INOTIFY_EVENT.size + length
+            directory = self.watches.get(wd)
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+            if directory is None:
+                continue
+            path = os.path.join(directory, os.fsdecode(name)) if len(name) > 0 else directory
+            if self.is_excluded(path):
+                continue
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                # New directory, the files inside are changes too
+                self.add_tree(path)
+                for root, _, files in os.walk(path):
+                    result.update(os.path.join(root, f) for f in files)
+            result.add(path)
+        return result
+
+    def wait(self):
+        changed = set()  # type: set[str]
+        while True:
+            ready, _, _ = select.select([self.fd], [], [], SETTLE_TIME if len(changed) > 0 else None)
+            if len(ready) == 0:
+                return changed
+            changed.update(self.read_events())
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def create_watcher(directories: list[str], exclude: list[str], polling: bool = False) -> Watcher:
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directories, exclude)
+        except (OSError, AttributeError) as e:
+            print(f"Cannot use inotify ({e}), falling back to polling")
+    return PollingWatcher(directories, exclude)
@@ -0,0 +1,244 @@
+-- Copyright (C) 2023 Boba Birds Developers
+--
+-- Permission is hereby granted, free of charge, to any person obtaining a
+-- copy of this software and associated documentation files (the "Software"),
+-- to deal in the Software without restriction, including without limitation
+-- the rights to use, copy, modify, merge, publish, distribute, sublicense,
+-- and/or sell copies of the Software, and to permit persons to whom the
+-- Software is furnished to do so, subject to the following conditions:
+--
+-- The above copyright notice and this permission notice shall be included in
+-- all copies or substantial portions of the Software.
+--
+-- THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+-- OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+-- FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+-- AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+-- LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+-- FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+-- DEALINGS IN THE SOFTWARE.
+
+-- Layout-only rectangle placement, used to estimate atlas dimensions without baking pixels.
+-- Mirrors fasterguin/packers/layout.py.
+
+local layout = {}
+
+---@param sizes {[1]: integer, [2]: integer}[]
+local function sortByArea(sizes)
+	local order = {}
+	for i = 1, #sizes do
+		order[i] = i
+	end
+
+	table.sort(order, function(a, b)
+		local areaA, areaB = sizes[a][1] * sizes[a][2], sizes[b][1] * sizes[b][2]
+		if areaA ~= areaB then
+			return areaA > areaB
+		end
+
+		local maxA, maxB = math.max(sizes[a][1], sizes[a][2]), math.max(sizes[b][1], sizes[b][2])
+		if maxA ~= maxB then
+			return maxA > maxB
+		end
+
+		return a < b
+	end)
+
+	return order
+end
+
+local function newNode(x, y, w, h)
+	return {x = x, y = y, w = w, h = h, used = false}
+end
+
+local function findNode(root, w, h)
+	-- Depth-first, right before down
+	local stack = {root}
+
+	while #stack > 0 do
+		local node = table.remove(stack)
+
+		if node.used then
+			stack[#stack + 1] = node.down
+			stack[#stack + 1] = node.right
+		elseif w <= node.w and h <= node.h then
+			return node
+		end
+	end
+
+	return nil
+end
+
+local function splitNode(node, w, h)
+	node.used = true
+	node.down = newNode(node.x, node.y + h, node.w, node.h - h)
+	node.right = newNode(node.x + w, node.y, node.w - w, h)
+	return node
+end
+
+---@param sizes {[1]: integer, [2]: integer}[]
+---@return integer width
+---@return integer height
+function layout.tree(sizes)
+	local order = sortByArea(sizes)
+	if #order == 0 then
+		return 0, 0
+	end
+
+	local width, height = 0, 0
+	local root = newNode(0, 0, sizes[order[1]][1], sizes[order[1]][2])
+
+	for _, i in ipairs(order) do
+		local w, h = sizes[i][1], sizes[i][2]
+		local node = findNode(root, w, h)
+
+		if not node then
+			local canGrowDown = w <= root.w
+			local canGrowRight = h <= root.h
+			local shouldGrowRight = canGrowRight and root.h >= root.w + w
+			local shouldGrowDown = canGrowDown and root.w >= root.h + h
+			local newRoot
+
+			if shouldGrowRight or (canGrowRight and not shouldGrowDown) then
+				newRoot = newNode(0, 0, root.w + w, root.h)
+				newRoot.down = root
+				newRoot.right = newNode(root.w, 0, w, root.h)
+			else
+				newRoot = newNode(0, 0, root.w, root.h + h)
+				newRoot.down = newNode(0, root.h, root.w, h)
+				newRoot.right = root
+			end
+
+			newRoot.used = true
+			root = newRoot
+			node = assert(findNode(root, w, h))
+		end
+
+		splitNode(node, w, h)
+		width = math.max(width, node.x + w)
+		height = math.max(height, node.y + h)
+	end
+
+	return width, height
+end
+
+---@param sizes {[1]: integer, [2]: integer}[]
+---@return integer width
+---@return integer height
+function layout.grid(sizes)
+	if #sizes == 0 then
+		return 0, 0
+	end
+
+	local order = {}
+	local maxWidth, area = 0, 0
+	for i, size in ipairs(sizes) do
+		order[i] = i
+		maxWidth = math.max(maxWidth, size[1])
+		area = area + size[1] * size[2]
+	end
+
+	table.sort(order, function(a, b)
+		if sizes[a][2] ~= sizes[b][2] then
+			return sizes[a][2] > sizes[b][2]
+		elseif sizes[a][1] ~= sizes[b][1] then
+			return sizes[a][1] > sizes[b][1]
+		end
+
+		return a < b
+	end)
+
+	local target = math.max(maxWidth, math.ceil(math.sqrt(area)))
+	local x, y, rowHeight, width = 0, 0, 0, 0
+
+	for _, i in ipairs(order) do
+		local w, h = sizes[i][1], sizes[i][2]
+
+		if x + w > target then
+			x = 0
+			y = y + rowHeight
+			rowHeight = 0
+		end
+
+		x = x + w
+		rowHeight = math.max(rowHeight, h)
+		width = math.max(width, x)
+	end
+
+	return width, y + rowHeight
+end
+
+---@param sizes {[1]: integer, [2]: integer}[]
+---@param extrude integer
+function layout.extend(sizes, extrude)
+	local result = {}
+
+	for i, size in ipairs(sizes) do
+		result[i] = {size[1] + extrude * 2, size[2] + extrude * 2}
+	end
+
+	return result
+end
+
+-- First-fit decreasing assignment of rectangles to pages, each page must fit in maxSize.
+-- Returns list of pages, each is list of indices in ascending order.
+---@param sizes {[1]: integer, [2]: integer}[]
+---@param algorithm "tree"|"grid"
+---@param maxSize integer
+---@return integer[][]
+function layout.paginate(sizes, algorithm, maxSize)
+	local function fits(page)
+		local pageSizes = {}
+		for i, v in ipairs(page) do
+			pageSizes[i] = sizes[v]
+		end
+
+		local width, height = layout[algorithm](pageSizes)
+		return math.max(width, height) <= maxSize
+	end
+
+	local all = {}
+	for i = 1, #sizes do
+		all[i] = i
+	end
+
+	if fits(all) then
+		return {all}
+	end
+
+	local pages = {}
+	-- Total area of each page. Rectangle that doesn't fit in the remaining area is not laid out at all.
+	local areas = {}
+
+	for _, i in ipairs(sortByArea(sizes)) do
+		local area = sizes[i][1] * sizes[i][2]
+		local placed = false
+
+		for n, page in ipairs(pages) do
+			if areas[n] + area <= maxSize * maxSize then
+				page[#page + 1] = i
+
+				if fits(page) then
+					areas[n] = areas[n] + area
+					placed = true
+					break
+				end
+
+				page[#page] = nil
+			end
+		end
+
+		if not placed then
+			pages[#pages + 1] = {i}
+			areas[#pages] = area
+		end
+	end
+
+	for _, page in ipairs(pages) do
+		table.sort(page)
+	end
+
+	return pages
+end
+
+return layout
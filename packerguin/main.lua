@@ -18,11 +18,13 @@
 -- FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 -- DEALINGS IN THE SOFTWARE.
 
+local ffi = require("ffi")
 local love = require("love")
 ---@type RTA
 local RTA = require("RTA")
 local argparse = require("argparse")
 local JSON = require("JSON")
+local layout = require("layout")
 local mounter = require("mounter")
 
 local function getDir(path)
@@ -37,26 +39,108 @@ local function getDir(path)
 	return rpath:sub(rpath:find("/", 1, true) or 1):reverse()
 end
 
-function love.load(arg, uarg)
-	local parser = argparse(love.arg.getLow(uarg), "Custom bb_rw packer.", "Confidential")
-	parser:argument("input", "RTA format input file")
-	parser:argument("output", "Output directory", ".", function(p) return love.path.endslash(love.path.normalslashes(p)) end, "?")
-	parser:option("-a --algorithm", "Select algorithm", "grid"):choices({"tree", "grid"})
-	parser:flag("-2 --po2", "Always extend atlas to Power-of-2")
+-- Converts glob to Lua pattern. "*" and "?" don't match "/" but "**" does.
+---@param glob string
+local function globToPattern(glob)
+	local result = {}
+	local i = 1
+
+	while i <= #glob do
+		local c = glob:sub(i, i)
+
+		if glob:sub(i, i + 1) == "**" then
+			result[#result + 1] = ".*"
+			i = i + 1
+		elseif c == "*" then
+			result[#result + 1] = "[^/]*"
+		elseif c == "?" then
+			result[#result + 1] = "[^/]"
+		elseif c:find("%W") then
+			result[#result + 1] = "%"..c
+		else
+			result[#result + 1] = c
+		end
 
-	local status, args = parser:pparse(arg)
-	if not status then
-		io.stderr:write("Error: ", args, "\n")
-		print(parser:get_help())
-		return love.event.quit(1)
+		i = i + 1
+	end
+
+	return "^"..table.concat(result).."$"
+end
+
+-- Comma-separated globs. Patterns without "/" match the file name, the rest match the whole path.
+---@param data string
+local function newGlobList(data)
+	local list = {}
+
+	for item in data:gmatch("[^,]+") do
+		local pattern = item:match("^%s*(.-)%s*$"):gsub("\\", "/")
+
+		if #pattern > 0 then
+			list[#list + 1] = {pattern = globToPattern(pattern), path = pattern:find("/", 1, true) ~= nil}
+		end
+	end
+
+	return list
+end
+
+---@param path string
+local function matchGlobList(list, path)
+	local name = path:match("[^/]*$")
+
+	for _, glob in ipairs(list) do
+		if (glob.path and path or name):find(glob.pattern) then
+			return true
+		end
 	end
 
-	args.output = args.output or "./"
+	return false
+end
+
+-- Returns the bounding box of non-transparent pixels, or nil if the image is fully transparent.
+---@param image love.ImageData
+local function getAlphaBounds(image)
+	local width, height = image:getDimensions()
+	local getAlpha
+
+	if image:getFormat() == "rgba8" and image.getFFIPointer then
+		local pixels = ffi.cast("uint8_t*", image:getFFIPointer())
+		function getAlpha(x, y)
+			return pixels[(y * width + x) * 4 + 3]
+		end
+	else
+		function getAlpha(x, y)
+			return select(4, image:getPixel(x, y))
+		end
+	end
 
-	local inputFile = assert(io.open(args.input, "rb"))
+	local minX, minY, maxX, maxY = width, height, -1, -1
+	for y = 0, height - 1 do
+		for x = 0, width - 1 do
+			if getAlpha(x, y) > 0 then
+				minX = math.min(minX, x)
+				maxX = math.max(maxX, x)
+				minY = math.min(minY, y)
+				maxY = y
+			end
+		end
+	end
+
+	if maxX == -1 then
+		return nil
+	end
+
+	return minX, minY, maxX - minX + 1, maxY - minY + 1
+end
+
+---@param args {input: string, output: string, algorithm: string, po2: boolean, raw: string?}
+---@param log fun(text: string)
+---@param track fun(object: any): any
+---@return {json: string, pages: {output: string, width: integer, height: integer, png: string?, raw: string?}[]}
+local function packJob(args, log, track)
+	local inputFile = track(assert(io.open(args.input, "rb")))
 	assert(mounter.MountPhysFS(getDir(args.input), "input", false))
 
-	print("Input: "..args.input)
+	log("Input: "..args.input)
 
 	-- Parse RTA files
 	local rtaData = {
@@ -65,13 +149,17 @@ function love.load(arg, uarg)
 		extrude = -1,
 		currentExtrude = 10,
 		prefix = "",
+		trim = false,
+		-- Applied to the folder commands after them
+		recursive = false,
+		include = {},
+		exclude = {},
 		startFiles = false,
 		file = {},
+		-- Images with same pixels as one in file, they share the same viewport
+		alias = {},
+		hashes = {},
 	}
-	local atlas = RTA.newDynamicSize(0, 0, 0, args.algorithm)
-	atlas:setMaxSize(1024, 1024)
-	atlas:setExtrude(10)
-
 	local lineCount = 1
 
 	local function ensureNoFiles(command)
@@ -100,27 +188,55 @@ function love.load(arg, uarg)
 			end
 		end
 
-		return file
+		return track(file)
 	end
 
 	local function addFile(path, soft)
 		local file = loadImage(path, soft)
 
 		if file then
-			print(string.format("image %s dimension %dx%d", path, file:getDimensions()))
-			if file:getWidth() >= rtaData.size or file:getHeight() >= rtaData.size then
+			log(string.format("image %s dimension %dx%d", path, file:getDimensions()))
+			local id = rtaData.prefix..path
+			local hash = string.format("%s:%dx%d:%s", file:getFormat(), file:getWidth(), file:getHeight(), love.data.hash("sha256", file))
+
+			if rtaData.hashes[hash] then
+				log("image "..path.." is duplicate of "..rtaData.hashes[hash].id)
+				rtaData.alias[#rtaData.alias + 1] = {id = id, target = rtaData.hashes[hash]}
+				file:release()
+				return
+			end
+
+			local trim
+
+			if rtaData.trim then
+				local x, y, w, h = getAlphaBounds(file)
+				-- Fully transparent image is kept as-is
+				trim = {x or 0, y or 0, file:getDimensions()}
+
+				if x and (w ~= trim[3] or h ~= trim[4]) then
+					local trimmed = track(love.image.newImageData(w, h, file:getFormat()))
+					trimmed:paste(file, 0, 0, x, y, w, h)
+					file:release()
+					file = trimmed
+					log(string.format("image %s trimmed to %dx%d at %d,%d", path, w, h, x, y))
+				end
+			end
+
+			-- The largest extrude must fit, as the extrude of the page is not known yet.
+			local extrude = rtaData.extrude == -1 and rtaData.currentExtrude or rtaData.extrude
+			if math.max(file:getDimensions()) + extrude * 2 > rtaData.size then
 				error("Image '"..path.."' exceeded maximum atlas size "..rtaData.size.." at line "..lineCount)
 			end
 
-			local id = rtaData.prefix..path
 			local infoData = {
 				image = file,
-				id = id
+				id = id,
+				trim = trim
 			}
-			atlas:add(file, id)
 			rtaData.file[#rtaData.file + 1] = infoData
+			rtaData.hashes[hash] = infoData
 		else
-			print("Image '"..path.."' is not a valid image file")
+			log("Image '"..path.."' is not a valid image file")
 		end
 	end
 
@@ -132,7 +248,12 @@ function love.load(arg, uarg)
 			local command, data = line:match("(%a+)%s+(.+)")
 
 			if not command then
-				error("Unexpected data at line "..lineCount)
+				-- Empty include or exclude matches everything again
+				command, data = line:match("^%s*(%a+)%s*$"), ""
+
+				if not command or (command:lower() ~= "include" and command:lower() ~= "exclude") then
+					error("Unexpected data at line "..lineCount)
+				end
 			end
 			command = command:lower()
 
@@ -142,14 +263,23 @@ function love.load(arg, uarg)
 			elseif command == "size" then
 				ensureNoFiles(command)
 				rtaData.size = ensureNumber(command, data)
-				atlas:setMaxSize(rtaData.size, rtaData.size)
 				if rtaData.extrude == -1 then
 					rtaData.currentExtrude = math.ceil(math.log(rtaData.size, 2))
-					atlas:setExtrude(rtaData.currentExtrude)
 				end
 			elseif command == "prefix" then
 				ensureNoFiles(command)
 				rtaData.prefix = love.path.endslash(data)
+			elseif command == "trim" then
+				ensureNoFiles(command)
+				data = data:lower()
+
+				if data == "yes" or data == "true" or data == "1" then
+					rtaData.trim = true
+				elseif data == "no" or data == "false" or data == "0" then
+					rtaData.trim = false
+				else
+					error("Invalid value for command '"..command.."' at line "..lineCount)
+				end
 			elseif command == "extrude" then
 				ensureNoFiles(command)
 
@@ -164,10 +294,21 @@ function love.load(arg, uarg)
 
 				if rtaData.extrude == -1 then
 					rtaData.currentExtrude = math.ceil(math.log(rtaData.size, 2))
-					atlas:setExtrude(rtaData.currentExtrude)
+				end
+			elseif command == "recursive" then
+				data = data:lower()
+
+				if data == "yes" or data == "true" or data == "1" then
+					rtaData.recursive = true
+				elseif data == "no" or data == "false" or data == "0" then
+					rtaData.recursive = false
 				else
-					atlas:setExtrude(rtaData.extrude)
+					error("Invalid value for command '"..command.."' at line "..lineCount)
 				end
+			elseif command == "include" then
+				rtaData.include = newGlobList(data)
+			elseif command == "exclude" then
+				rtaData.exclude = newGlobList(data)
 			elseif command == "file" then
 				if not rtaData.startFiles then
 					rtaData.startFiles = true
@@ -180,13 +321,30 @@ function love.load(arg, uarg)
 				end
 
 				local normalData = love.path.endslash(love.path.normalslashes(data))
-
-				for _, list in ipairs(love.filesystem.getDirectoryItems("input/"..data)) do
-					local actualPath = normalData..list
-
-					if love.filesystem.getInfo("input/"..actualPath, "file") then
-						addFile(actualPath, true)
+				-- Subdirectories relative to the folder, scanned in order
+				local directories = {""}
+				local i = 1
+
+				while i <= #directories do
+					local subdirectory = directories[i]
+					local directory = i == 1 and data or normalData..subdirectory:sub(1, -2)
+
+					for _, list in ipairs(love.filesystem.getDirectoryItems("input/"..directory)) do
+						local relativePath = subdirectory..list
+						local actualPath = normalData..relativePath
+
+						if love.filesystem.getInfo("input/"..actualPath, "file") then
+							local included = #rtaData.include == 0 or matchGlobList(rtaData.include, relativePath)
+
+							if included and not matchGlobList(rtaData.exclude, relativePath) then
+								addFile(actualPath, true)
+							end
+						elseif rtaData.recursive and love.filesystem.getInfo("input/"..actualPath, "directory") then
+							directories[#directories + 1] = relativePath.."/"
+						end
 					end
+
+					i = i + 1
 				end
 			end
 		end
@@ -194,64 +352,339 @@ function love.load(arg, uarg)
 		lineCount = lineCount + 1
 	end
 
-	local baked
-	local SORTBY = "area"
-	if rtaData.extrude == -1 then
-		print("Determining best extrude. Initial guess is "..rtaData.currentExtrude)
-
-		-- Determine best extrude
-		while true do
-			atlas:setExtrude(rtaData.currentExtrude)
-			baked = select(2, atlas:bake(SORTBY))
-			local extrude = math.ceil(math.log(math.max(baked:getDimensions()), 2))
-			if rtaData.currentExtrude ~= extrude then
-				print("Current extrude: "..rtaData.currentExtrude.."; new extrude: "..extrude)
-				rtaData.currentExtrude = extrude
-				baked:release()
-			else
-				print("Found best extrude: "..extrude)
-				rtaData.extrude = extrude
-				break
+	inputFile:close()
+
+	-- Images that don't fit in single atlas spill to more pages, named output_0, output_1, ...
+	local sizes = {}
+	for i, v in ipairs(rtaData.file) do
+		sizes[i] = {v.image:getDimensions()}
+	end
+
+	local fitExtrude = rtaData.extrude == -1 and rtaData.currentExtrude or rtaData.extrude
+	local pages = layout.paginate(layout.extend(sizes, fitExtrude), args.algorithm, rtaData.size)
+
+	-- Removes the smallest images from the page until its area shrinks by the excess factor (at least one image
+	-- is removed and one is kept). Returns the removed images.
+	---@param page integer[]
+	---@param excess number
+	local function splitPage(page, excess)
+		local order = {}
+		local area = 0
+		for i, v in ipairs(page) do
+			order[i] = v
+			area = area + sizes[v][1] * sizes[v][2]
+		end
+
+		table.sort(order, function(a, b)
+			local areaA, areaB = sizes[a][1] * sizes[a][2], sizes[b][1] * sizes[b][2]
+			if areaA ~= areaB then
+				return areaA > areaB
 			end
+
+			return a < b
+		end)
+
+		local target = area / excess
+		local moved = {}
+		repeat
+			local v = table.remove(order)
+			moved[#moved + 1] = v
+			area = area - sizes[v][1] * sizes[v][2]
+		until #order == 1 or area <= target
+
+		for i = #page, 1, -1 do
+			page[i] = nil
 		end
-	else
-		baked = select(2, atlas:hardBake(SORTBY))
+
+		for i, v in ipairs(order) do
+			page[i] = v
+		end
+
+		table.sort(page)
+		table.sort(moved)
+		return moved
 	end
 
-	if math.max(baked:getDimensions()) > rtaData.size then
-		error(string.format("Resulting atlas exceeded permitted POT size %d, atlas is %dx%d", rtaData.size, baked:getDimensions()))
+	if #pages > 1 then
+		log(string.format("Atlas split into %d pages", #pages))
 	end
 
-	if args.po2 then
-		print("Ensuring PO2")
+	-- Bakes single page with RTA
+	---@param page integer[]
+	local function bakePage(page)
+		local pageSizes = {}
+		local atlas = RTA.newDynamicSize(0, 0, 0, args.algorithm)
+		atlas:setMaxSize(rtaData.size, rtaData.size)
 
-		local newBaked = love.image.newImageData(rtaData.size, rtaData.size)
-		newBaked:paste(baked, 0, 0, 0, 0, baked:getDimensions())
-		baked:release()
-		baked = newBaked
+		for i, v in ipairs(page) do
+			pageSizes[i] = sizes[v]
+			atlas:add(rtaData.file[v].image, rtaData.file[v].id)
+		end
+
+		local baked
+		local SORTBY = "area"
+		if rtaData.extrude == -1 then
+			local currentExtrude = rtaData.currentExtrude
+			log("Determining best extrude. Initial guess is "..currentExtrude)
+
+			-- Find the fixed point using layout-only passes, no pixels are baked.
+			local startTime = love.timer.getTime()
+			local iterations = 0
+			local tried = {}
+			while true do
+				iterations = iterations + 1
+				tried[currentExtrude] = true
+				local width, height = layout[args.algorithm](layout.extend(pageSizes, currentExtrude))
+				local extrude = math.ceil(math.log(math.max(width, height), 2))
+				if currentExtrude == extrude then
+					break
+				elseif tried[extrude] then
+					-- Oscillating, take the larger one
+					currentExtrude = math.max(currentExtrude, extrude)
+					break
+				end
+
+				log("Current extrude: "..currentExtrude.."; new extrude: "..extrude)
+				currentExtrude = extrude
+			end
+
+			log(string.format("Estimated extrude %d in %d layout pass(es), %.3fms", currentExtrude, iterations, (love.timer.getTime() - startTime) * 1000))
+
+			-- Bake once. The estimate uses our own layout, so verify it against the real atlas and
+			-- continue with full bakes in the rare case they disagree.
+			local bakes = 0
+			startTime = love.timer.getTime()
+			while true do
+				bakes = bakes + 1
+				atlas:setExtrude(currentExtrude)
+				baked = track(select(2, atlas:bake(SORTBY)))
+				local extrude = math.ceil(math.log(math.max(baked:getDimensions()), 2))
+				if currentExtrude ~= extrude then
+					log("Current extrude: "..currentExtrude.."; new extrude: "..extrude)
+					currentExtrude = extrude
+					baked:release()
+				else
+					log("Found best extrude: "..extrude)
+					break
+				end
+			end
+
+			log(string.format("Baked %d time(s), %.3fms", bakes, (love.timer.getTime() - startTime) * 1000))
+		else
+			atlas:setExtrude(rtaData.extrude)
+			baked = track(select(2, atlas:hardBake(SORTBY)))
+		end
+
+		return atlas, baked
 	end
 
-	local png = args.output..rtaData.output..".png"
-	print("Writing "..png)
+	local outputFile = args.output..rtaData.output
+	local result = {pages = {}}
+	local viewports = {}
 
-	local pngData = baked:encode("png")
-	local pngOut = assert(io.open(png, "wb"))
-	pngOut:write(pngData:getString())
-	pngOut:close()
+	local pageNum = 1
+	while pageNum <= #pages do
+		local page = pages[pageNum]
+		local atlas, baked = bakePage(page)
 
-	local jsonFileOut = args.output..rtaData.output..".json"
-	print("Writing "..jsonFileOut)
+		while math.max(baked:getDimensions()) > rtaData.size do
+			if #page == 1 then
+				error(string.format("Resulting atlas exceeded permitted POT size %d, atlas is %dx%d", rtaData.size, baked:getDimensions()))
+			end
 
-	local jsonData = {}
+			-- Our layout estimate is smaller than RTA's, so move the last-added (smallest) images to new page
+			-- after this one, proportional to the excess area, and bake this page again.
+			local excess = (math.max(baked:getDimensions()) / rtaData.size) ^ 2
+			baked:release()
+			table.insert(pages, pageNum + 1, splitPage(page, excess))
+			log(string.format("Page %d exceeded permitted POT size %d, atlas split into %d pages", pageNum, rtaData.size, #pages))
+			atlas, baked = bakePage(page)
+		end
 
-	for _, v in ipairs(rtaData.file) do
-		jsonData[v.id] = {atlas:getViewport(v.id)}
+		if args.po2 then
+			log("Ensuring PO2")
+
+			local newBaked = track(love.image.newImageData(rtaData.size, rtaData.size))
+			newBaked:paste(baked, 0, 0, 0, 0, baked:getDimensions())
+			baked:release()
+			baked = newBaked
+		end
+
+		local pageOutput = outputFile
+		local pageRaw = args.raw
+		if #pages > 1 then
+			pageOutput = pageOutput.."_"..(pageNum - 1)
+			pageRaw = pageRaw and pageRaw.."_"..(pageNum - 1)
+		end
+
+		local pageResult = {output = pageOutput, width = baked:getWidth(), height = baked:getHeight()}
+
+		if pageRaw and baked:getFormat() == "rgba8" then
+			-- Uncompressed RGBA8, skips PNG encoding and decoding on the other side
+			log("Writing "..pageRaw)
+			local rawOut = track(assert(io.open(pageRaw, "wb")))
+			rawOut:write(baked:getString())
+			rawOut:close()
+			pageResult.raw = pageRaw
+		else
+			local png = pageOutput..".png"
+			log("Writing "..png)
+
+			local pngData = track(baked:encode("png"))
+			local pngOut = track(assert(io.open(png, "wb")))
+			pngOut:write(pngData:getString())
+			pngOut:close()
+			pageResult.png = png
+		end
+
+		for _, v in ipairs(page) do
+			local id = rtaData.file[v].id
+			local trim = rtaData.file[v].trim
+			local viewport = {atlas:getViewport(id)}
+			if #pages > 1 or trim then
+				viewport[5] = pageNum - 1
+			end
+
+			if trim then
+				-- Offset of the trimmed image and the original dimensions
+				for i = 1, 4 do
+					viewport[5 + i] = trim[i]
+				end
+			end
+
+			viewports[id] = viewport
+		end
+
+		result.pages[pageNum] = pageResult
+		baked:release()
+		pageNum = pageNum + 1
 	end
 
-	local jsonData = JSON:encode_pretty(jsonData, nil, {pretty=true, indent="\t"})
-	local jsonOut = assert(io.open(jsonFileOut, "wb"))
+	for _, v in ipairs(rtaData.alias) do
+		viewports[v.id] = viewports[v.target.id]
+	end
+
+	local jsonFileOut = outputFile..".json"
+	log("Writing "..jsonFileOut)
+
+	local jsonData = JSON:encode_pretty(viewports, nil, {pretty=true, indent="\t"})
+	local jsonOut = track(assert(io.open(jsonFileOut, "wb")))
 	jsonOut:write(jsonData)
 	jsonOut:close()
+	result.json = jsonFileOut
+
+	for _, v in ipairs(rtaData.file) do
+		v.image:release()
+	end
+
+	return result
+end
+
+-- Runs the pack job, then closes the files and releases the images it opened, also when it fails. This matters for
+-- server mode, which runs many jobs in the same process.
+---@param args table
+---@param log fun(text: string)
+local function pack(args, log)
+	local resources = {}
+	local function track(object)
+		resources[#resources + 1] = object
+		return object
+	end
+
+	local status, result = xpcall(packJob, function(err)
+		log(debug.traceback(tostring(err), 2))
+		return err
+	end, args, log, track)
+
+	for i = #resources, 1, -1 do
+		local object = resources[i]
+
+		if io.type(object) == "file" then
+			object:close()
+		elseif io.type(object) == nil then
+			-- Already released objects are ignored
+			object:release()
+		end
+	end
+
+	if not status then
+		error(result, 0)
+	end
+
+	return result
+end
+
+-- Server mode. Each line in stdin is a JSON job {"input", "output", "algorithm", "po2", "raw"} and
+-- each job is answered with single JSON line in stdout, either the result of pack or {"error"}.
+-- Logs are written to stderr.
+local function serve()
+	local function log(text)
+		io.stderr:write(text, "\n")
+	end
+
+	for line in io.stdin:lines() do
+		line = line:gsub("\r", "")
+
+		if #line > 0 then
+			local result
+			local status, job = pcall(JSON.decode, JSON, line)
+
+			if status and type(job) == "table" and type(job.input) == "string" then
+				job.output = love.path.endslash(love.path.normalslashes(job.output or "."))
+				job.algorithm = job.algorithm or "grid"
+
+				local ok, packResult = pcall(pack, job, log)
+				mounter.UnmountPhysFS(getDir(job.input))
+
+				if ok then
+					result = packResult
+				else
+					result = {error = tostring(packResult)}
+				end
+			else
+				result = {error = "Invalid job: "..tostring(job)}
+			end
+
+			io.stdout:write(JSON:encode(result), "\n")
+			io.stdout:flush()
+			collectgarbage()
+		end
+	end
+end
+
+function love.load(arg, uarg)
+	local parser = argparse(love.arg.getLow(uarg), "Custom bb_rw packer.", "Confidential")
+	parser:argument("input", "RTA format input file", nil, nil, "?")
+	parser:argument("output", "Output directory", ".", function(p) return love.path.endslash(love.path.normalslashes(p)) end, "?")
+	parser:option("-a --algorithm", "Select algorithm", "grid"):choices({"tree", "grid"})
+	parser:flag("-2 --po2", "Always extend atlas to Power-of-2")
+	parser:flag("-s --server", "Run pack jobs from stdin until it's closed")
+	parser:option("-r --raw", "Write atlas as raw RGBA8 pixels to this file instead of PNG")
+	parser:option("--result", "Write the result as JSON to this file")
+
+	local status, args = parser:pparse(arg)
+	if status and not args.server and not args.input then
+		status, args = false, "missing argument 'input'"
+	end
+
+	if not status then
+		io.stderr:write("Error: ", args, "\n")
+		print(parser:get_help())
+		return love.event.quit(1)
+	end
+
+	if args.server then
+		serve()
+	else
+		args.output = args.output or "./"
+		local result = pack(args, print)
+
+		if args.result then
+			local resultOut = assert(io.open(args.result, "wb"))
+			resultOut:write(JSON:encode(result))
+			resultOut:close()
+		end
+	end
 
 	return love.event.quit(0)
 end
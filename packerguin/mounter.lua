@@ -61,4 +61,13 @@ function mounter.MountPhysFS(newDir, mountPoint, appendToPath)
 	return true
 end
 
+---@param oldDir string
+function mounter.UnmountPhysFS(oldDir)
+	if not PhysFS.PHYSFS_unmount(oldDir) then
+		return nil, getLastPhysFSErr()
+	end
+
+	return true
+end
+
 return mounter
@@ -0,0 +1,107 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import json
+import os
+import stat
+import sys
+import tempfile
+import threading
+import unittest
+
+from fasterguin import tools
+from fasterguin.packers.lua import LuaPacker
+
+# Stand-in for LOVE running packerguin in server mode. The first request of the whole test makes the daemon exit (or
+# hang), the rest are answered with empty atlas.
+FAKE_LOVE = """#!{python}
+import json, os, sys, time
+marker = {marker!r}
+for line in sys.stdin:
+    job = json.loads(line)
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        if {hang!r}:
+            time.sleep(60)
+        sys.exit(3)
+    print(json.dumps({{"json": {result!r}, "pages": []}}), flush=True)
+"""
+
+
+@unittest.skipIf(os.name == "nt", "needs executable script")
+class PackerDaemonTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.result = os.path.join(self.tempdir.name, "result.json")
+        with open(self.result, "w", encoding="UTF-8") as f:
+            json.dump({}, f)
+        tools.get_tool_runner().reset_stats()
+        self.addCleanup(tools.get_tool_runner().reset_stats)
+
+    def make_packer(self, hang: bool):
+        love = os.path.join(self.tempdir.name, "love")
+        marker = os.path.join(self.tempdir.name, "crashed")
+        with open(love, "w", encoding="UTF-8") as f:
+            f.write(FAKE_LOVE.format(python=sys.executable, marker=marker, hang=hang, result=self.result))
+        os.chmod(love, os.stat(love).st_mode | stat.S_IEXEC)
+        packer = LuaPacker({"love": love, "packer": self.tempdir.name, "packer_daemons": "1"})
+        self.addCleanup(packer.close)
+        return packer
+
+    def run_threads(self, packer: LuaPacker, count: int):
+        errors = []  # type: list[Exception]
+        results = []  # type: list[dict]
+
+        def run():
+            try:
+                results.append(packer.run_daemon({"input": "in.txt", "output": "out", "algorithm": "grid"}))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, daemon=True) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+            self.assertFalse(thread.is_alive(), "packer request is still waiting")
+        return results, errors
+
+    def test_crashed_daemon_is_replaced(self):
+        results, errors = self.run_threads(self.make_packer(False), 2)
+        self.assertEqual(len(errors), 1)
+        self.assertIn("exited with code 3", str(errors[0]))
+        self.assertEqual(len(results), 1)
+
+    def test_hung_daemon_times_out(self):
+        runner = tools.get_tool_runner()
+        runner.set_timeout("love", 0.5)
+        self.addCleanup(runner.timeouts.pop, "love", None)
+        results, errors = self.run_threads(self.make_packer(True), 2)
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], tools.ToolError)
+        self.assertTrue(errors[0].timed_out)
+        self.assertEqual(len(results), 1)
+        stats = runner.get_stats()["love"]
+        self.assertEqual((stats.runs, stats.failures, stats.timeouts), (2, 1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import tempfile
+import time
+import unittest
+
+from fasterguin.asset import Asset
+from fasterguin.commands.base import Command, Job
+from fasterguin.plan import BuildPlan
+from fasterguin.profiles.pc import PCProfile
+
+
+class WriteCommand(Command):
+    # Records when its job is run. Earlier commands take longer, so unordered jobs finish in reverse.
+    def __init__(self, value: str, delay: float, order: list[str]):
+        Command.__init__(self, value)
+        self.delay = delay
+        self.order = order
+
+    def get_dependencies(self, context: Asset):
+        return [context.get_input_path(self.value)]
+
+    def plan(self, context: Asset):
+        return [Job(self.write, None, context.get_output_path(self.value))]
+
+    def write(self):
+        time.sleep(self.delay)
+        self.order.append(self.value)
+
+
+class ParallelPlanTest(unittest.TestCase):
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.asset = Asset(PCProfile({"image_backend": "pillow", "packer_engine": "python"}))
+        self.asset.set_input_directory(os.path.join(tempdir.name, "input"))
+        self.asset.set_output_directory(os.path.join(tempdir.name, "output"))
+
+    def run_plan(self, *values: str):
+        order = []  # type: list[str]
+        plan = BuildPlan()
+        for line, value in enumerate(values):
+            plan.add_command(line + 1, WriteCommand(value, 0.3 - line * 0.1, order))
+        plan.execute([self.asset], 4)
+        return order
+
+    def test_output_inside_directory(self):
+        self.assertEqual(self.run_plan("ui", "ui/a.png"), ["ui", "ui/a.png"])
+        self.assertEqual(self.run_plan("ui/a.png", "ui"), ["ui/a.png", "ui"])
+
+    def test_unrelated_outputs(self):
+        self.assertEqual(self.run_plan("ui", "uix/a.png"), ["uix/a.png", "ui"])
+
+
+if __name__ == "__main__":
+    unittest.main()
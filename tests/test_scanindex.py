@@ -0,0 +1,53 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import tempfile
+import unittest
+
+from fasterguin.scanindex import ScanIndex
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n\x00\x00\x00\x0dIHDR\x00\x00\x00\x02\x00\x00\x00\x03"
+
+
+@unittest.skipIf(os.name == "nt", "needs symlinks")
+class ScanIndexTest(unittest.TestCase):
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.root = tempdir.name
+        os.makedirs(os.path.join(self.root, "a", "b"))
+        with open(os.path.join(self.root, "a", "b", "c.png"), "wb") as f:
+            f.write(PNG_HEADER)
+
+    def test_symlink_cycle(self):
+        os.symlink(os.path.join(self.root, "a"), os.path.join(self.root, "a", "b", "loop"))
+        entries = ScanIndex().scan(self.root, True)
+        self.assertEqual([entry.name for entry in entries], ["a/b/c.png"])
+        self.assertEqual(entries[0].get_dimensions(), (2, 3))
+
+    def test_symlinked_directory(self):
+        os.symlink(os.path.join(self.root, "a", "b"), os.path.join(self.root, "link"))
+        names = sorted(entry.name for entry in ScanIndex().scan(self.root, True))
+        self.assertEqual(names, ["a/b/c.png", "link/c.png"])
+
+
+if __name__ == "__main__":
+    unittest.main()
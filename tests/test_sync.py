@@ -0,0 +1,49 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import tempfile
+import unittest
+
+from fasterguin import sync
+
+
+@unittest.skipIf(os.name == "nt", "needs symlinks")
+class SyncDirectoryTest(unittest.TestCase):
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.src = os.path.join(tempdir.name, "src")
+        self.dst = os.path.join(tempdir.name, "dst")
+        os.makedirs(os.path.join(self.src, "a"))
+        with open(os.path.join(self.src, "a", "b.txt"), "wb") as f:
+            f.write(b"b")
+
+    def test_symlink_cycle(self):
+        os.symlink(self.src, os.path.join(self.src, "a", "loop"))
+        index = sync.SyncIndex()
+        self.assertEqual(sync.sync_directory(self.src, self.dst, index), (1, 1, 0))
+        self.assertEqual(index.get_files(self.dst), [os.path.join("a", "b.txt")])
+        # Unchanged the second time
+        self.assertEqual(sync.sync_directory(self.src, self.dst, index), (0, 1, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+# Copyright (C) 2023 Boba Birds Developers
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS
+# OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import tempfile
+import unittest
+
+from fasterguin.main import create_asset, load_plan
+from fasterguin.profiles.pc import PCProfile
+from fasterguin.scanindex import ScanIndex
+from fasterguin.sync import SyncIndex
+
+try:
+    import PIL.Image
+except ImportError:
+    PIL = None
+
+
+@unittest.skipIf(PIL is None, "needs Pillow")
+class WatchDedupeTest(unittest.TestCase):
+    def setUp(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        self.input = os.path.join(tempdir.name, "input")
+        self.output = os.path.join(tempdir.name, "output")
+        os.makedirs(self.input)
+        with open(os.path.join(self.input, "input.txt"), "w", encoding="UTF-8") as f:
+            f.write("enable dedupe\nfile a.png\nfile b.png\n")
+        self.write_image("a.png", (255, 0, 0, 255))
+        self.write_image("b.png", (255, 0, 0, 255))
+
+    def write_image(self, name: str, color: tuple[int, int, int, int]):
+        PIL.Image.new("RGBA", (8, 8), color).save(os.path.join(self.input, name))
+
+    def read_color(self, name: str):
+        with PIL.Image.open(os.path.join(self.output, name)) as image:
+            return image.convert("RGBA").getpixel((0, 0))
+
+    def test_edited_first_duplicate(self):
+        profile = PCProfile({"image_backend": "pillow", "packer_engine": "python"})
+        asset = create_asset(profile, self.input, self.output, None, ScanIndex(), SyncIndex())
+        plan = load_plan(os.path.join(self.input, "input.txt"))
+        plan.execute([asset])
+        self.assertEqual(asset.real_sizes["b.png"], [8, 8, 8, 8, "a.png"])
+        # Rebuild only what watch mode would after a.png is edited
+        self.write_image("a.png", (0, 0, 255, 255))
+        plan.execute([asset], 1, plan.get_affected(asset, {os.path.join(self.input, "a.png")}))
+        self.assertEqual(asset.real_sizes["a.png"], [8, 8, 8, 8])
+        self.assertEqual(asset.real_sizes["b.png"], [8, 8, 8, 8])
+        self.assertEqual(self.read_color("a.png"), (0, 0, 255, 255))
+        self.assertEqual(self.read_color("b.png"), (255, 0, 0, 255))
+        # Same pixels again, so b.png is alias of a.png
+        self.write_image("a.png", (255, 0, 0, 255))
+        plan.execute([asset], 1, plan.get_affected(asset, {os.path.join(self.input, "a.png")}))
+        self.assertEqual(asset.real_sizes["b.png"], [8, 8, 8, 8, "a.png"])
+
+
+if __name__ == "__main__":
+    unittest.main()